@@ -1,22 +1,28 @@
-import bisect
-import operator
+import math
 import random
+from collections import OrderedDict
+
 import numpy
 
+from dtools_lib import delimited_record
+
+
+def numpy_random():
+    """
+    A NumPy generator seeded from the random module, so that batches drawn with NumPy are reproducible whenever random
+    was seeded.
+    """
+    return numpy.random.default_rng(random.getrandbits(64))
+
+
+def normal_probability(mean, std_dev, minimum=None, maximum=None):
+    """Probability of a value of N(mean, std_dev) being in [minimum, maximum] (either bound may be None)"""
+    if std_dev == 0:
+        return 1.0 if (minimum is None or minimum <= mean) and (maximum is None or mean <= maximum) else 0.0
 
-def accumulate(iterable, func=operator.add):
-    """Return running totals"""
-    # accumulate([1,2,3,4,5]) --> 1 3 6 10 15
-    # accumulate([1,2,3,4,5], operator.mul) --> 1 2 6 24 120
-    it = iter(iterable)
-    try:
-        total = next(it)
-    except StopIteration:
-        return
-    yield total
-    for element in it:
-        total = func(total, element)
-        yield total
+    def cdf(x):
+        return 0.5 * math.erfc((mean - x) / (std_dev * math.sqrt(2)))
+    return (1.0 if maximum is None else cdf(maximum)) - (0.0 if minimum is None else cdf(minimum))
 
 
 class Chooser(object):
@@ -29,24 +35,140 @@ class Chooser(object):
     def choose(self):
         return random.choice(self.choices_)
 
+    def choose_many(self, n):
+        """A NumPy array of n choices"""
+        return self.choice_array_()[numpy_random().integers(0, len(self.choices_), n)]
+
+    def choice_array_(self):
+        # Of dtype object, so that the choices are returned as they are, not converted to a common NumPy type
+        return numpy.fromiter(self.choices_, dtype=object, count=len(self.choices_))
+
 
 class GaussianChooser(Chooser):
-    """Random number chooser with a Gaussian (normal) distribution."""
-    def __init__(self, mean, std_dev, samples=1000):
-        super(GaussianChooser, self).__init__(numpy.random.normal(mean, std_dev, samples))
+    """
+    Random number chooser with a Gaussian (normal) distribution.  Values are drawn with NumPy a block at a time, and
+    the block is refilled once it has been used up.  It has no list of choices, so choices() raises TypeError.
+    """
+    DEFAULT_BLOCK_SIZE = 1 << 14
+    # Number of times the values out of range are drawn again before giving up
+    MAX_REDRAWS = 100
+    # Smallest probability of a value in range that truncation is allowed for
+    MIN_TRUNCATED_PROBABILITY = 1e-3
+
+    def __init__(self, mean, std_dev, minimum=None, maximum=None, truncate=False, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        :param minimum: smallest value chosen, if any
+        :param maximum: largest value chosen, if any
+        :param truncate: draw again the values out of [minimum, maximum] (a truncated normal distribution) instead of
+            clamping them to the nearest bound, which is refused (with a ValueError) when less than
+            MIN_TRUNCATED_PROBABILITY of the distribution is in range
+        """
+        super(GaussianChooser, self).__init__(None)
+        if minimum is not None and maximum is not None and minimum > maximum:
+            raise ValueError('minimum is larger than maximum')
+        self.probability_ = normal_probability(mean, std_dev, minimum, maximum)
+        if truncate and self.probability_ < self.MIN_TRUNCATED_PROBABILITY:
+            raise ValueError('too few values of N({0}, {1}) are between {2} and {3} to truncate it'.format(
+                mean, std_dev, minimum, maximum))
+        self.mean_ = mean
+        self.std_dev_ = std_dev
+        self.minimum_ = minimum
+        self.maximum_ = maximum
+        self.truncate_ = truncate
+        self.block_size_ = block_size
+        self.block_ = []
+        self.next_ = 0
+
+    def choices(self):
+        raise TypeError('a GaussianChooser has no list of choices')
+
+    def choose(self):
+        if self.next_ == len(self.block_):
+            self.block_ = self.choose_many(self.block_size_).tolist()
+            self.next_ = 0
+        self.next_ += 1
+        return self.block_[self.next_ - 1]
+
+    def choose_many(self, n):
+        rng = numpy_random()
+        values = rng.normal(self.mean_, self.std_dev_, n)
+        if self.minimum_ is None and self.maximum_ is None:
+            return values
+        if not self.truncate_:
+            return numpy.clip(values, self.minimum_, self.maximum_)
+        # Each redraw draws enough values for the ones still missing to be in range with high probability
+        values = values[self.in_range_(values)]
+        for _ in range(self.MAX_REDRAWS):
+            if len(values) >= n:
+                return values[:n]
+            more = rng.normal(self.mean_, self.std_dev_, int((n - len(values)) * 1.2 / self.probability_) + 16)
+            values = numpy.concatenate([values, more[self.in_range_(more)]])
+        raise ValueError('values of N({0}, {1}) still out of range after {2} redraws'.format(
+            self.mean_, self.std_dev_, self.MAX_REDRAWS))
+
+    def in_range_(self, values):
+        in_range = numpy.ones(len(values), dtype=numpy.bool_)
+        if self.minimum_ is not None:
+            in_range &= values >= self.minimum_
+        if self.maximum_ is not None:
+            in_range &= values <= self.maximum_
+        return in_range
 
 
 class WeightedChooser(Chooser):
     def __init__(self, weighted_choices):
         """
         Create an object that makes a weighted choice where choices with higher weights are more likely to be chosen.
+        Choices are drawn in constant time with Walker's alias method (as improved by Vose).
 
         :param weighted_choices: an iterable of tuples where the first element is a choice and the second element is a
             weight
         """
         choices, weights = zip(*weighted_choices)
         super(WeightedChooser, self).__init__(choices)
-        self.cumulative_weights_ = list(accumulate(weights))
+        if any(not w >= 0 for w in weights):
+            raise ValueError('the weights of the choices cannot be negative')
+        n = len(weights)
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError('the total weight of the choices has to be positive')
+        # Split the choices into n equally likely columns: column i holds choice i with probability probabilities_[i],
+        # and its alias aliases_[i] otherwise
+        probabilities = [w * n / total for w in weights]
+        aliases = list(range(n))
+        small = [i for i, p in enumerate(probabilities) if p < 1]
+        large = [i for i, p in enumerate(probabilities) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            aliases[s] = l
+            probabilities[l] += probabilities[s] - 1
+            (small if probabilities[l] < 1 else large).append(l)
+        # What is left only differs from 1 by rounding errors
+        for i in small + large:
+            probabilities[i] = 1.0
+        self.probabilities_ = probabilities
+        self.aliases_ = aliases
+
+    @classmethod
+    def from_file(cls, fileobj, choice_field, weight_field=None, sep='|'):
+        """
+        Create a chooser from a column of a delimited file, weighted by another column or, without weight_field, by how
+        often each value occurs in the column.
+        """
+        weights = OrderedDict()
+        for rec in delimited_record.read_records(fileobj, sep=sep):
+            choice = rec[choice_field]
+            weights[choice] = weights.get(choice, 0) + (1 if weight_field is None else float(rec[weight_field]))
+        return cls(weights.items())
 
     def choose(self):
-        return self.choices_[bisect.bisect(self.cumulative_weights_, random.random() * self.cumulative_weights_[-1])]
+        x = random.random() * len(self.choices_)
+        i = int(x)
+        return self.choices_[i] if x - i < self.probabilities_[i] else self.choices_[self.aliases_[i]]
+
+    def choose_many(self, n):
+        rng = numpy_random()
+        columns = rng.integers(0, len(self.choices_), n)
+        indexes = numpy.where(rng.random(n) < numpy.asarray(self.probabilities_)[columns], columns,
+                              numpy.asarray(self.aliases_)[columns])
+        return self.choice_array_()[indexes]
@@ -5,23 +5,36 @@ from faker.providers.person.en_US import Provider as BasePersonNameProvider
 
 from dtools_lib import chooser
 from dtools_lib.lazy import LazyDictionary
+from dtools_lib.reference_table import load_table, subtract_ranges
 
 
 class CsvProvider(BaseProvider):
+    """
+    Draws rows of a delimited file, held in a ReferenceTable (loaded from its snapshot when there is one).  The rows
+    are returned as RowViews of the table, with the field names prefixed with prefix.
+    """
+
     def __init__(self, generator, fileobj, sep='|', prefix=None):
         super(CsvProvider, self).__init__(generator)
-        self.header_ = fileobj.readline().rstrip().split(sep)
-        if prefix is not None:
-            self.header_ = [prefix + x for x in self.header_]
-        self.rows_ = []
-        for line in fileobj:
-            self.rows_.append(line.rstrip().split(sep))
+        # Rows with missing or extra fields are accepted, as they always were
+        self.table_ = load_table(fileobj, sep=sep, ragged=True)
+        self.header_ = self.table_.keys() if prefix is None else [prefix + x for x in self.table_.keys()]
+        self.index_ = dict((field, i) for i, field in enumerate(self.header_))
+
+    @staticmethod
+    def file_keys(fileobj, sep='|', prefix=None):
+        """The keys supplied by a provider of the file, read from its header without loading the rows"""
+        header = fileobj.readline().rstrip().split(sep)
+        return header if prefix is None else [prefix + x for x in header]
+
+    def keys(self):
+        return list(self.header_)
 
     def generate(self):
-        return dict(zip(self.header_, self.random_element(self.rows_)))
+        return self.table_.view(self.random_int(0, len(self.table_) - 1), self.index_)
 
 
-class ItineraryProvider(CsvProvider):
+class ItineraryProvider(BaseProvider):
     ADMISSIONCLASSES = [
         'K3', 'K2', 'J2', 'K4', 'P3', 'G4', 'P2', 'V3', 'Q3', 'L1A', 'L2', 'C1', 'D1', 'D2', 'K1',
         'G3', 'V2', 'P4', 'L1B', 'H4', 'G5', 'H3', 'G2', 'C4', 'P1', 'C2', 'J1', 'C1D', 'Q2', 'V1',
@@ -34,37 +47,93 @@ class ItineraryProvider(CsvProvider):
         'IQ', 'OS', 'AM', 'AC', 'PC', 'SU', 'AR', 'AF', 'FI', 'JM', 'AI', 'KX', 'MS', 'HH', 'KQ', 'UP',
         'AS', 'AG']
 
-    def __init__(self, generator, fileobj, sep='|'):
-        super(ItineraryProvider, self).__init__(generator, fileobj, sep)
+    LEG_KEYS = ['airport', 'country', 'region', 'municipality', 'carrier', 'flight_number']
+
+    # Where the arrival airport is drawn from, given the departure airport (which it never is)
+    ARRIVAL_CONSTRAINTS = ['different_airport', 'different_country', 'same_country', 'same_region']
+
+    def __init__(self, generator, fileobj, sep='|', arrival='different_airport'):
+        """
+        :param arrival: one of ARRIVAL_CONSTRAINTS, the arrival airport being drawn from any other airport when no
+            airport meets the constraint
+        """
+        super(ItineraryProvider, self).__init__(generator)
+        if arrival not in ItineraryProvider.ARRIVAL_CONSTRAINTS:
+            raise ValueError('arrival has to be one of ' + ', '.join(ItineraryProvider.ARRIVAL_CONSTRAINTS))
+        self.arrival_ = arrival
+        # Grouped by country, like the airports of dt_generate_trips
+        self.airports_ = load_table(fileobj, key='country_code', sep=sep)
+
+    @staticmethod
+    def file_keys(fileobj=None, sep='|', prefix=None):
+        # The same whatever the airports file
+        return ItineraryProvider.keys()
+
+    @staticmethod
+    def keys():
+        return ['admission_class', 'contact_phone_number'] + \
+            [prefix + key for prefix in ('departure_', 'arrival_') for key in ItineraryProvider.LEG_KEYS]
 
     def generate(self):
         result = LazyDictionary({
             'admission_class': lambda: self.random_element(ItineraryProvider.ADMISSIONCLASSES),
             'contact_phone_number': lambda: self.generator.phone_number(),
         })
-        self.leg_(result, 'departure_')
-        self.leg_(result, 'arrival_', airportNotIn=[result['departure_airport']])
+        departure = self.leg_(result, 'departure_')
+        self.leg_(result, 'arrival_', self.arrival_rows_(departure), airportNotIn=[result['departure_airport']])
         return result
 
-    def leg_(self, ld, prefix, airportNotIn=None):
-        leg_data = CsvProvider.generate(self)
-        if airportNotIn is not None:
-            while leg_data['iata_code'] in airportNotIn:
-                leg_data = CsvProvider.generate(self)
+    def arrival_rows_(self, departure):
+        airports = self.airports_
+        if self.arrival_ == 'different_country':
+            return subtract_ranges(airports.all_rows(), airports.group_rows(airports.get(departure, 'country_code')))
+        if self.arrival_ == 'same_country':
+            return airports.group_rows(airports.get(departure, 'country_code'))
+        if self.arrival_ == 'same_region':
+            return airports.rows_where('iso_region', airports.get(departure, 'iso_region'))
+        return airports.all_rows()
+
+    def randbelow_(self, n):
+        return self.random_int(0, n - 1)
+
+    def leg_(self, ld, prefix, rows=None, airportNotIn=()):
+        """
+        Draws the airport of a leg from rows (all the airports by default), leaving out the airports in airportNotIn
+        without drawing again, and returns its row
+        """
+        airports = self.airports_
+        excluded = [r for airport in airportNotIn for r in airports.rows_where('iata_code', airport)]
+        i = airports.choose(self.randbelow_, airports.all_rows() if rows is None else rows, excluded)
+        if i is None and rows is not None:
+            i = airports.choose(self.randbelow_, airports.all_rows(), excluded)
+        if i is None:
+            raise ValueError('No airport left to draw a leg from')
         ld.update({
-            prefix + 'airport': leg_data['iata_code'],
-            prefix + 'country': leg_data['country_code'],
-            prefix + 'region': leg_data['iso_region'],
-            prefix + 'municipality': leg_data['municipality'],
+            prefix + 'airport': airports.get(i, 'iata_code'),
+            prefix + 'country': airports.get(i, 'country_code'),
+            prefix + 'region': airports.get(i, 'iso_region'),
+            prefix + 'municipality': airports.get(i, 'municipality'),
             prefix + 'carrier': lambda: self.random_element(ItineraryProvider.CARRIERS),
             prefix + 'flight_number': lambda: self.generator.random_int(min=0, max=9000),
         })
+        return i
 
 
 class AddressProvider(CsvProvider):
     def __init__(self, generator, fileobj, sep='|', prefix=None):
         super(AddressProvider, self).__init__(generator, fileobj, sep, prefix)
-        self.street_ = 'street' if prefix is None else prefix + 'street'
+        self.street_ = AddressProvider.street_key(prefix)
+
+    @staticmethod
+    def street_key(prefix=None):
+        return 'street' if prefix is None else prefix + 'street'
+
+    @staticmethod
+    def file_keys(fileobj, sep='|', prefix=None):
+        return [AddressProvider.street_key(prefix)] + CsvProvider.file_keys(fileobj, sep, prefix)
+
+    def keys(self):
+        return [self.street_] + CsvProvider.keys(self)
 
     def generate(self):
         result = LazyDictionary({self.street_: lambda: self.generator.street_address()})
@@ -78,6 +147,9 @@ class SequenceProvider(object):
         self.step_ = step
         self.name_ = name
 
+    def keys(self):
+        return [self.name_]
+
     def generate(self):
         self.seq_ += self.step_
         return {self.name_: self.seq_}
@@ -89,6 +161,10 @@ class GenderProvider(object):
     def __init__(self, weighted_genders=DEFAULT_WEIGHTED_GENDERS):
         self.gender_chooser = chooser.WeightedChooser(weighted_genders)
 
+    @staticmethod
+    def keys(prefix=''):
+        return [prefix + 'gender']
+
     def generate(self, prefix=''):
         return LazyDictionary({prefix + 'gender': lambda: self.gender_chooser.choose()})
 
@@ -116,6 +192,10 @@ class BiometricProvider(object):
         self.male_height_chooser = chooser.GaussianChooser(70, 4)
         self.male_weight_chooser = chooser.GaussianChooser(165, 40)
 
+    @staticmethod
+    def keys(prefix=''):
+        return [prefix + key for key in ('height', 'weight', 'blood_type', 'eye_color', 'hair_color')]
+
     def generate(self, gender, prefix=''):
         return LazyDictionary({
             prefix + 'height': lambda d:
@@ -137,6 +217,11 @@ class PersonNameProvider(BasePersonNameProvider):
     male_populated_middle_probability = 0.4
     male_populated_suffix_probability = -0.05
 
+    @staticmethod
+    def keys(prefix=''):
+        return [prefix + key for key in
+                ('name', 'name_prefix', 'first_name', 'middle_name', 'last_name', 'name_suffix')]
+
     def generate(self, gender, prefix=''):
         if gender == 'F':
             title = self.prefix_female() if random.random() <= self.female_populated_title_probability else ''
@@ -162,6 +247,11 @@ class PersonNameProvider(BasePersonNameProvider):
 
 
 class PersonDetailsProvider(BaseProvider):
+    @staticmethod
+    def keys(prefix=''):
+        return [prefix + key for key in ('free_email', 'email', 'birth_date', 'citizenship', 'passport_number',
+                                         'occupation', 'company', 'ssn', 'website', 'phone_number')]
+
     def generate(self, prefix=''):
         return LazyDictionary({
             prefix + 'free_email': lambda: self.generator.free_email(),
@@ -1,4 +1,62 @@
-from collections import OrderedDict
+import itertools
+
+
+class Header(object):
+    """
+    The field names of a stream of records and their positions.  A single Header is shared by all the records of a
+    stream, so that records only need to hold their values.
+    """
+    __slots__ = ('fields', 'index')
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.index = dict((field, i) for i, field in enumerate(self.fields))
+        # Positions map onto themselves, so a record can be indexed by name or by position with a single lookup
+        num_fields = len(self.fields)
+        self.index.update((i, i) for i in range(-num_fields, num_fields))
+
+    def __len__(self):
+        return len(self.fields)
+
+
+class Record(object):
+    """A record whose values can be fetched by field name (rec['name']) or by position (rec[i])"""
+    __slots__ = ('header', 'values_')
+
+    def __init__(self, header, values):
+        self.header = header
+        self.values_ = values
+
+    def __getitem__(self, key):
+        return self.values_[self.header.index[key]]
+
+    def __setitem__(self, key, value):
+        self.values_[self.header.index[key]] = value
+
+    def __contains__(self, key):
+        return key in self.header.index
+
+    def __len__(self):
+        return len(self.values_)
+
+    def __iter__(self):
+        return iter(self.header.fields)
+
+    def get(self, key, default=None):
+        i = self.header.index.get(key)
+        return default if i is None else self.values_[i]
+
+    def keys(self):
+        return self.header.fields
+
+    def values(self):
+        return self.values_
+
+    def items(self):
+        return zip(self.header.fields, self.values_)
+
+    def __repr__(self):
+        return 'Record({0!r})'.format(dict(self.items()))
 
 
 # If you know the header and don't need the records generated as a dicts (they're generated as lists here), this gives
@@ -8,19 +66,45 @@ def read_delimited(fileobj, sep='|'):
         yield row.rstrip().split(sep)
 
 
-# Generates records as ordered dicts
-def read_records(fileobj, header=None, sep='|'):
+# Generates rows as lists, checking that they have as many columns as the header
+def read_rows(fileobj, header=None, sep='|'):
     if header is None:
         header = fileobj.readline().rstrip().split(sep)
+    header = header.fields if isinstance(header, Header) else header
     num_rows = len(header)
     for row in read_delimited(fileobj, sep):
         if len(row) != num_rows:
             raise ValueError('Expected {0:d} columns, but got {1:d}:\n{2}\n{3}'.format(num_rows, len(row), sep.join(header), sep.join(row)))
-        yield OrderedDict(zip(header, row))
+        yield row
+
+
+# Generates records as Records sharing a single Header
+def read_records(fileobj, header=None, sep='|'):
+    if header is None:
+        header = fileobj.readline().rstrip().split(sep)
+    if not isinstance(header, Header):
+        header = Header(header)
+    for row in read_rows(fileobj, header, sep):
+        yield Record(header, row)
 
 
 def cut_fields(fileobj, desired_fields, header=None, sep='|'):
     if header is None:
         header = fileobj.readline().rstrip().split(sep)
-    for rec in read_records(fileobj, header, sep):
-        yield [rec[i] for i in desired_fields]
+    if not isinstance(header, Header):
+        header = Header(header)
+    indexes = [header.index[field] for field in desired_fields]
+    for row in read_rows(fileobj, header, sep):
+        yield [row[i] for i in indexes]
+
+
+# Generates batches of up to batch_size records as lists of columns (in header order)
+def read_column_batches(fileobj, header=None, sep='|', batch_size=10000):
+    if header is None:
+        header = fileobj.readline().rstrip().split(sep)
+    rows = read_rows(fileobj, header, sep)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        yield [list(col) for col in zip(*batch)]
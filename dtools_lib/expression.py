@@ -0,0 +1,333 @@
+import itertools
+from collections import OrderedDict, defaultdict
+
+import pyparsing as pp
+
+from dtools_lib import transforms
+from dtools_lib import vectorized
+
+FLD_PFX = '$'
+CONSTANTS = {'True': True, 'False': False, 'None': None}
+
+# --- AST --- #
+class ASTNode(object):
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.assignFields()
+
+    def assignFields(self):
+        pass
+
+    def __str__(self):
+        return self.__class__.__name__ + ':' + str(self.__dict__)
+
+    __repr__ = __str__
+
+
+class Assignment(ASTNode):
+    def assignFields(self):
+        self.lhs, self.rhs = self.tokens
+        del self.tokens
+        self.rhs = self.rhs[0]
+
+
+class FunctionCall(ASTNode):
+    def assignFields(self):
+        self.fnName, self.args = self.tokens
+        del self.tokens
+        self.args = list(self.args)
+        # Resolve the transform once, when the AST is built, instead of eval()-ing it for every record
+        try:
+            self.fn = getattr(transforms, self.fnName)
+        except AttributeError:
+            raise ValueError('Unknown function: {0}'.format(self.fnName))
+
+    def is_volatile(self):
+        return transforms.is_volatile(self.fnName)
+
+
+class InFixFunctionCall(FunctionCall):
+    symbolToFunctionMap_ = {
+        '==': 'Equals',
+        '!=': 'NotEquals',
+        '<': 'LessThan',
+        '<=': 'LessThanOrEquals',
+        '>': 'GreaterThan',
+        '>=': 'GreaterThanOrEquals',
+        '&&': 'All',
+        '||': 'Any',
+    }
+
+    def __init__(self, tokens):
+        args = tokens[0]
+        if len(args) == 1:
+            args.extend(['==', True])
+        super(InFixFunctionCall, self).__init__(
+            [InFixFunctionCall.symbolToFunctionMap_[args[1]], [args[0]] + args[2:]])
+
+
+class FetchField(FunctionCall):
+    def __init__(self, f):
+        super(FetchField, self).__init__(['Field', [f[0][len(FLD_PFX):]]])
+
+    @property
+    def field_name(self):
+        return self.args[0]
+
+
+# --- Grammar --- #
+def _build_grammar(with_comparisons):
+    LPAR, RPAR, EQ = map(pp.Suppress, '()=')
+    identifier = pp.pyparsing_common.identifier
+    numeric = pp.pyparsing_common.number
+    boolean = pp.Literal('True') | pp.Literal('False')
+    constant = boolean | pp.Literal('None')
+    constant.setParseAction(lambda t: [CONSTANTS[t[0]]])
+    quoted_string = pp.quotedString.copy().addParseAction(pp.removeQuotes)
+    field = pp.Word(FLD_PFX, pp.alphanums + '_').setName('field')
+    function = pp.Forward()
+    atom = field | numeric | quoted_string | constant | function
+    comparison = pp.Forward()
+    if with_comparisons:
+        atom = atom | comparison
+    function << identifier + pp.Group(LPAR + pp.Optional(pp.delimitedList(atom)) + RPAR)
+    compare_operator = pp.oneOf('== != < <= > >= && ||')
+    comparison << pp.Group(atom + compare_operator + atom)
+    assignment = identifier + EQ + pp.Group(function) | identifier + EQ + pp.Group(atom)
+    assignments = pp.delimitedList(assignment, delim=';')
+
+    field.setParseAction(lambda t: FetchField(t))
+    function.setParseAction(FunctionCall)
+    comparison.setParseAction(InFixFunctionCall)
+    assignment.setParseAction(Assignment)
+    return assignments, comparison
+
+
+ASSIGNMENTS, _ = _build_grammar(with_comparisons=False)
+_, COMPARISON = _build_grammar(with_comparisons=True)
+
+
+# --- Optimizer and compiler --- #
+class Expression(object):
+    """
+    A compiled expression: a list of statement closures evaluated in order against transforms.RECORD (or against a
+    Batch when compiled by the BatchCompiler).  Calling it evaluates every statement for the current record and
+    returns the value of the last one.
+    """
+
+    def __init__(self, statements, record_cache, assigned_fields=()):
+        self.statements_ = statements
+        self.record_cache_ = record_cache
+        self.assigned_fields = list(assigned_fields)
+
+    def output_header(self, header):
+        """The header of the records once the expression has been evaluated: the input's plus any new fields"""
+        result = list(header)
+        for field in self.assigned_fields:
+            if field not in result:
+                result.append(field)
+        return result
+
+    def __call__(self, *args):
+        # Shared subexpression values are only valid for the record they were computed from
+        self.record_cache_.clear()
+        result = None
+        for statement in self.statements_:
+            result = statement(*args)
+        return result
+
+
+class Compiler(object):
+    """
+    Turns ASTs into closures in two passes.  The first pass folds calls whose arguments are all constants into
+    constants and computes a structural key for every call, the second pass compiles the calls, routing the ones
+    whose key occurs more than once through a per-record cache so that they are evaluated only once per record.
+    Field keys carry the number of preceding assignments to that field, so a subexpression that reads a field is not
+    shared across an assignment that changes it.
+    """
+
+    def __init__(self, fold_constants=True, share_subexpressions=True):
+        self.fold_constants_ = fold_constants
+        self.share_subexpressions_ = share_subexpressions
+        self.record_cache_ = {}
+        self.key_counts_ = defaultdict(int)
+        self.field_versions_ = defaultdict(int)
+
+    def compile_assignments(self, assignments):
+        assignments = list(assignments)
+        for assignment in assignments:
+            assignment.rhs = self.fold_(assignment.rhs)
+            self.key_(assignment.rhs)
+            self.field_versions_[assignment.lhs] += 1
+        return Expression([self.compile_assignment_(a) for a in assignments], self.record_cache_,
+                          [a.lhs for a in assignments])
+
+    def compile_comparison(self, comparison):
+        comparison = self.fold_(comparison)
+        self.key_(comparison)
+        return Expression([self.compile_atom_(comparison)], self.record_cache_)
+
+    def fold_(self, atom):
+        if not isinstance(atom, FunctionCall) or isinstance(atom, FetchField):
+            return atom
+        atom.args = [self.fold_(arg) for arg in atom.args]
+        if self.fold_constants_ and not atom.is_volatile() and \
+                not any(isinstance(arg, FunctionCall) for arg in atom.args):
+            return atom.fn(*atom.args)
+        return atom
+
+    def key_(self, atom):
+        if isinstance(atom, FetchField):
+            return 'Field', atom.field_name, self.field_versions_[atom.field_name]
+        if not isinstance(atom, FunctionCall):
+            try:
+                hash(atom)
+            except TypeError:
+                return None
+            # The type is part of the key so that 1, 1.0, True and '1' are all distinct
+            return 'Constant', type(atom).__name__, atom
+        arg_keys = [self.key_(arg) for arg in atom.args]
+        if atom.is_volatile() or None in arg_keys:
+            atom.key_ = None
+        else:
+            atom.key_ = (atom.fnName, tuple(arg_keys))
+            self.key_counts_[atom.key_] += 1
+        return atom.key_
+
+    def compile_assignment_(self, assignment):
+        lhs = assignment.lhs
+        rhs = self.compile_atom_(assignment.rhs)
+
+        def assign():
+            result = rhs()
+            transforms.RECORD[lhs] = result
+            return result
+        return assign
+
+    def compile_atom_(self, atom):
+        if isinstance(atom, FetchField):
+            field_name = atom.field_name
+            # transforms.RECORD is rebound for every record, so it has to be looked up on each call
+            return lambda: transforms.RECORD[field_name]
+        if not isinstance(atom, FunctionCall):
+            return lambda: atom
+        fn = self.compile_call_(atom, [self.compile_atom_(arg) for arg in atom.args])
+        if self.share_subexpressions_ and atom.key_ is not None and self.key_counts_[atom.key_] > 1:
+            fn = self.share_(atom.key_, fn)
+        return fn
+
+    def compile_call_(self, atom, args):
+        fn = atom.fn
+        # Specialize the common arities to avoid building an argument list for every call
+        if len(args) == 0:
+            return fn
+        if len(args) == 1:
+            a0 = args[0]
+            return lambda: fn(a0())
+        if len(args) == 2:
+            a0, a1 = args
+            return lambda: fn(a0(), a1())
+        if len(args) == 3:
+            a0, a1, a2 = args
+            return lambda: fn(a0(), a1(), a2())
+        return lambda: fn(*[a() for a in args])
+
+    def share_(self, key, fn):
+        cache = self.record_cache_
+
+        def shared(*args):
+            try:
+                return cache[key]
+            except KeyError:
+                result = cache[key] = fn(*args)
+                return result
+        return shared
+
+
+# --- Columnar batch execution --- #
+class Batch(object):
+    """
+    A batch of records held as columns.  Columns are lists or numpy arrays, a column assigned a scalar holds the same
+    value for every record.  record_count is the number of records that preceded the batch.
+    """
+
+    def __init__(self, header, columns, record_count=0):
+        self.columns = OrderedDict(zip(header, columns))
+        self.size = len(columns[0]) if columns else 0
+        self.record_count = record_count
+
+    def rows(self, mask=None):
+        rows = zip(*[vectorized.to_list(vectorized.column(c, self.size)) for c in self.columns.values()])
+        if mask is None:
+            return rows
+        return itertools.compress(rows, vectorized.as_mask(mask, self.size))
+
+
+class BatchCompiler(Compiler):
+    """
+    Compiles ASTs into closures taking a Batch and returning whole columns.  Functions with a kernel in
+    dtools_lib.vectorized run once per batch, the others fall back to being called once per record.  Functions that
+    read the record are evaluated against the batch's columns.
+    """
+
+    def compile_assignment_(self, assignment):
+        lhs = assignment.lhs
+        rhs = self.compile_atom_(assignment.rhs)
+
+        def assign(batch):
+            result = rhs(batch)
+            batch.columns[lhs] = result
+            return result
+        return assign
+
+    def compile_atom_(self, atom):
+        if isinstance(atom, FetchField):
+            field_name = atom.field_name
+            return lambda batch: batch.columns[field_name]
+        if not isinstance(atom, FunctionCall):
+            return lambda batch: atom
+        return super(BatchCompiler, self).compile_atom_(atom)
+
+    def compile_call_(self, atom, args):
+        record_function = getattr(self, 'batch_' + atom.fnName, None)
+        if record_function is not None:
+            return lambda batch: record_function(batch, *[a(batch) for a in args])
+        fn = atom.fn
+        kernel = vectorized.KERNELS.get(atom.fnName)
+        volatile = atom.is_volatile()
+
+        def call(batch):
+            values = [a(batch) for a in args]
+            if not any(vectorized.is_column(v) for v in values):
+                # Volatile functions still have to produce a value per record
+                return vectorized.apply(fn, batch.size, values) if volatile else fn(*values)
+            if kernel is not None:
+                return kernel(batch.size, *values)
+            return vectorized.apply(fn, batch.size, values)
+        return call
+
+    @staticmethod
+    def batch_Field(batch, field):
+        if vectorized.is_column(field):
+            return [vectorized.column(batch.columns[f], batch.size)[i] for i, f in enumerate(field)]
+        return batch.columns[field]
+
+    @staticmethod
+    def batch_RecordCount(batch):
+        return list(range(batch.record_count + 1, batch.record_count + batch.size + 1))
+
+    @staticmethod
+    def batch_FieldCount(batch):
+        return len(batch.columns)
+
+
+def compile_assignments(text, batch=False, **kwargs):
+    """Compile a ';'-separated list of dt_derive assignments"""
+    compiler = BatchCompiler(**kwargs) if batch else Compiler(**kwargs)
+    return compiler.compile_assignments(ASSIGNMENTS.parseString(text, parseAll=True))
+
+
+def compile_comparison(text, batch=False, **kwargs):
+    """Compile a dt_filter comparison"""
+    compiler = BatchCompiler(**kwargs) if batch else Compiler(**kwargs)
+    return compiler.compile_comparison(COMPARISON.parseString(text, parseAll=True)[0])
@@ -1,7 +1,7 @@
-from collections import MutableMapping
-from copy import copy
-from inspect import getargspec
+from collections.abc import MutableMapping
+from inspect import Parameter, signature
 from threading import RLock
+from types import FunctionType, MethodType
 
 
 # --- lazy_property implementation --- #
@@ -60,6 +60,29 @@ class ConstantRedefinitionError(LazyDictionaryError):
 
 
 # --- LazyDictionary implementation --- #
+
+# States of the keys that have not been read yet (besides the number of arguments of a callable value to call), a key
+# that has been read and evaluated without an error has no state
+_VALUE = object()
+_EVALUATING = object()
+_ERROR = object()
+
+
+def arity(value):
+    """Number of positional arguments a callable takes, None when it cannot be told"""
+    if type(value) is FunctionType:
+        # Plain functions and lambdas, by far the most common
+        return value.__code__.co_argcount
+    if type(value) is MethodType:
+        # Counted with self, as getargspec counted them: wrap a bound method in a lambda to have it called
+        return arity(value.__func__)
+    try:
+        parameters = signature(value).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    return len([p for p in parameters if p.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)])
+
+
 class LazyDictionary(MutableMapping):
     """
     A LazyDicitonary behaves mostly like an ordinary dict, except:
@@ -71,73 +94,111 @@ class LazyDictionary(MutableMapping):
 
     These features allow values in the dictionary to be dependent on other values in the dictionary without regard to
     order of assignment. It also allows lazily not executing unused code
+
+    The number of arguments of a callable is found when it is stored.  Reads and writes are only serialized with a lock
+    when lock is true, which is not needed when a dictionary is only used by one thread (one record at a time).
     """
 
-    def __init__(self, values={}):
-        self.lock = RLock()
-        self.values = copy(values)
-        self.states = {}
-        for key in self.values:
-            self.states[key] = 'defined'
+    __slots__ = ('values_', 'states_', 'lock_')
+
+    def __init__(self, values=None, lock=False):
+        self.values_ = {}
+        self.states_ = {}
+        self.lock_ = RLock() if lock else None
+        if values:
+            for key, value in values.items():
+                self.define_(key, value)
+
+    def define_(self, key, value):
+        state = _VALUE
+        if callable(value):
+            n = arity(value)
+            if n == 0 or n == 1:
+                state = n
+        self.values_[key] = value
+        self.states_[key] = state
+
+    def evaluate_(self, key):
+        state = self.states_.get(key)
+        if state is None:
+            # Evaluated already (by another thread)
+            return self.values_[key]
+        if state is _EVALUATING:
+            raise CircularReferenceError('value of "%s" depends on itself' % key)
+        if state is _ERROR:
+            raise self.values_[key]
+        value = self.values_[key]
+        if state is not _VALUE:
+            self.states_[key] = _EVALUATING
+            try:
+                value = value() if state == 0 else value(self)
+            except Exception as ex:
+                self.values_[key] = ex
+                self.states_[key] = _ERROR
+                raise ex
+            self.values_[key] = value
+        del self.states_[key]
+        return value
 
     def __len__(self):
-        return len(self.values)
+        return len(self.values_)
 
     def __iter__(self):
-        return iter(self.values)
+        return iter(self.values_)
 
     def __getitem__(self, key):
-        with self.lock:
-            if key in self.states:
-                if self.states[key] == 'evaluating':
-                    raise CircularReferenceError('value of "%s" depends on itself' % key)
-                elif self.states[key] == 'error':
-                    raise self.values[key]
-                elif self.states[key] == 'defined':
-                    value = self.values[key]
-                    if callable(value):
-                        (args, varargs, keywords, defaults) = getargspec(value)
-                        if len(args) == 0:
-                            self.states[key] = 'evaluating'
-                            try:
-                                self.values[key] = value()
-                            except Exception as ex:
-                                self.values[key] = ex
-                                self.states[key] = 'error'
-                                raise ex
-                        elif len(args) == 1:
-                            self.states[key] = 'evaluating'
-                            try:
-                                self.values[key] = value(self)
-                            except Exception as ex:
-                                self.values[key] = ex
-                                self.states[key] = 'error'
-                                raise ex
-                    self.states[key] = 'evaluated'
-            return self.values[key]
+        if key not in self.states_:
+            return self.values_[key]
+        if self.lock_ is None:
+            return self.evaluate_(key)
+        with self.lock_:
+            return self.evaluate_(key)
+
+    def materialize(self, keys=None):
+        """dict of the (evaluated) values of the given keys that are in the dictionary, or of all of its keys"""
+        if keys is None:
+            keys = list(self.values_)
+        if self.lock_ is None:
+            return dict((key, self[key]) for key in keys if key in self.values_)
+        with self.lock_:
+            return dict((key, self[key]) for key in keys if key in self.values_)
 
     def __contains__(self, key):
-        return key in self.values
+        return key in self.values_
+
+    def frozen_(self, key):
+        return key in self.values_ and self.states_.get(key, _EVALUATING) is _EVALUATING
 
     def __setitem__(self, key, value):
-        with self.lock:
-            if key in self.states and self.states[key][0:4] == 'eval':
-                raise ConstantRedefinitionError('"%s" is immutable' % key)
-            self.values[key] = value
-            self.states[key] = 'defined'
+        if self.lock_ is None:
+            self.set_(key, value)
+        else:
+            with self.lock_:
+                self.set_(key, value)
+
+    def set_(self, key, value):
+        if self.frozen_(key):
+            raise ConstantRedefinitionError('"%s" is immutable' % key)
+        self.define_(key, value)
 
     def __delitem__(self, key):
-        with self.lock:
-            if key in self.states and self.states[key][0:4] == 'eval':
-                raise ConstantRedefinitionError('"%s" is immutable' % key)
-            del self.values[key]
-            del self.states[key]
+        if self.lock_ is None:
+            self.del_(key)
+        else:
+            with self.lock_:
+                self.del_(key)
+
+    def del_(self, key):
+        if self.frozen_(key):
+            raise ConstantRedefinitionError('"%s" is immutable' % key)
+        del self.values_[key]
+        del self.states_[key]
 
     def __str__(self):
-        return str(self.values)
+        return str(self.values_)
 
     def __repr__(self):
-        return "LazyDictionary({0})".format(repr(self.values))
+        return "LazyDictionary({0})".format(repr(self.values_))
 
 
 # Test / example of a lazy_property decorator
@@ -169,10 +230,8 @@ if __name__ == '__main__':
 
 
     def populate_template(t, d):
-        # The unfortunate thing here is that template substitutions hit all items in the dictionary even when the
-        # template doesn't need it.  To fix this we need to process the template string for the possible keys and
-        # only send in a dict with those keys.
-        return t.safe_substitute(dict((k, d[k]) for k in template_variables(t) if k in d))
+        # Template substitutions would hit all items in the dictionary, so only the keys in the template are evaluated
+        return t.safe_substitute(d.materialize(template_variables(t)))
 
 
     def expensive_function():
@@ -0,0 +1,113 @@
+import io
+import mmap
+import os
+import stat
+
+import numpy
+
+# Number of bytes scanned (and, when iterating over lines, decoded) at a time
+DEFAULT_WINDOW_SIZE = 1 << 24
+
+NEWLINE = ord('\n')
+
+
+def map_file(fileobj):
+    """
+    Map a delimited file into memory from its start.  Returns None when the file is a stream (e.g. stdin fed by a
+    pipe) or is empty, as those cannot be mapped, in which case the file object should be read as usual.
+    """
+    try:
+        st = os.fstat(fileobj.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+        return None
+    return MappedFile(fileobj, getattr(fileobj, 'encoding', None) or 'utf-8')
+
+
+class MappedFile(object):
+    """
+    A delimited file mapped into memory.  Lines are found by scanning the mapped bytes for newlines.  Reading it as
+    text (readline(), read() or iterating over its lines) decodes whole lines, a window at a time when iterating, so
+    the fields of a line are split and decoded as usual.  Only counting the fields of every line (field_counts) does
+    without decoding, the offsets it gives can then be used to decode the lines of interest.
+
+    It can stand in for a text file object wherever the file is read with readline(), read() or by iterating over its
+    lines, note that the lines it iterates over do not keep their newline.
+    """
+
+    def __init__(self, fileobj, encoding='utf-8', window_size=DEFAULT_WINDOW_SIZE):
+        self.map_ = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view_ = memoryview(self.map_)
+        self.size_ = len(self.map_)
+        self.encoding_ = encoding
+        self.window_size_ = window_size
+        self.position_ = 0
+
+    def decode(self, start, end):
+        return str(self.view_[start:end], self.encoding_)
+
+    def line_end_(self, position):
+        """Offset just past the newline ending the line at position (or the end of the file)"""
+        end = self.map_.find(b'\n', position)
+        return self.size_ if end < 0 else end + 1
+
+    def window_end_(self, position, size):
+        """Offset just past the last newline within size bytes of position, extended to a whole line if there is none"""
+        stop = position + size
+        if stop >= self.size_:
+            return self.size_
+        end = self.map_.rfind(b'\n', position, stop)
+        return self.line_end_(stop) if end < 0 else end + 1
+
+    def readline(self):
+        if self.position_ >= self.size_:
+            return ''
+        start, self.position_ = self.position_, self.line_end_(self.position_)
+        return self.decode(start, self.position_)
+
+    def read(self, size=-1):
+        """Read about size bytes worth of text, always ending on a line boundary"""
+        if self.position_ >= self.size_:
+            return ''
+        start = self.position_
+        self.position_ = self.size_ if size < 0 else self.window_end_(start, size)
+        return self.decode(start, self.position_)
+
+    def __iter__(self):
+        # Decoding and splitting a window at a time is much cheaper than decoding each line on its own
+        while True:
+            text = self.read(self.window_size_)
+            if not text:
+                break
+            lines = text.split('\n')
+            if lines[-1] == '':
+                lines.pop()
+            for line in lines:
+                yield line
+
+    def field_counts(self, sep='|'):
+        """
+        Generates (starts, ends, counts) numpy arrays for windows of the remaining lines: the byte offsets of the start
+        and end (excluding the newline) of each line, and the number of sep-separated fields it holds.
+        """
+        sep_bytes = sep.encode(self.encoding_)
+        # With a whitespace separator, trailing separators would be stripped along with the newline when reading lines
+        vectorized = len(sep_bytes) == 1 and not sep_bytes.isspace()
+        data = numpy.frombuffer(self.map_, dtype=numpy.uint8)
+        while self.position_ < self.size_:
+            start = self.position_
+            self.position_ = self.window_end_(start, self.window_size_)
+            window = data[start:self.position_]
+            ends = numpy.flatnonzero(window == NEWLINE)
+            if len(ends) == 0 or ends[-1] != len(window) - 1:
+                # The last line of the file has no newline
+                ends = numpy.append(ends, len(window))
+            starts = numpy.concatenate(([0], ends[:-1] + 1))
+            if vectorized:
+                seps = numpy.flatnonzero(window == sep_bytes[0])
+                counts = numpy.searchsorted(seps, ends) - numpy.searchsorted(seps, starts) + 1
+            else:
+                counts = numpy.array([bytes(window[s:e]).rstrip().count(sep_bytes) + 1 for s, e in zip(starts, ends)],
+                                     dtype=numpy.int64)
+            yield starts + start, ends + start, counts
@@ -0,0 +1,78 @@
+import os
+import sys
+
+# Number of characters collected before they are written out
+DEFAULT_FLUSH_SIZE = 1 << 18
+
+
+def exit_on_broken_pipe():
+    """
+    Exit quietly once the reader of stdout has gone away (e.g. output piped to head).  stdout is pointed at /dev/null
+    first, so that the interpreter's own flush at exit does not raise BrokenPipeError again.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    sys.exit(1)
+
+
+class OutputSink(object):
+    """
+    Collects output text and writes it to a stream in large blocks, encoded once per block and written to the binary
+    layer of the stream when it has one.  Use it as a context manager, or call close(), so that the last block is
+    written.
+    """
+
+    def __init__(self, stream=None, flush_size=DEFAULT_FLUSH_SIZE):
+        stream = sys.stdout if stream is None else stream
+        # Whatever was already written through the text layer (e.g. with print) has to go out first
+        stream.flush()
+        self.stream_ = stream
+        self.binary_ = getattr(stream, 'buffer', None)
+        self.encoding_ = getattr(stream, 'encoding', None) or 'utf-8'
+        self.errors_ = getattr(stream, 'errors', None) or 'strict'
+        self.flush_size_ = flush_size
+        self.pending_ = []
+        self.pending_size_ = 0
+
+    def write(self, text):
+        self.pending_.append(text)
+        self.pending_size_ += len(text)
+        if self.pending_size_ >= self.flush_size_:
+            self.flush()
+
+    def write_line(self, line):
+        self.write(line + '\n')
+
+    def write_record(self, fields, sep='|'):
+        self.write(sep.join(fields) + '\n')
+
+    def writelines(self, lines):
+        for text in lines:
+            self.write(text)
+
+    def flush(self):
+        if not self.pending_:
+            return
+        text = ''.join(self.pending_)
+        self.pending_ = []
+        self.pending_size_ = 0
+        try:
+            if self.binary_ is not None:
+                self.binary_.write(text.encode(self.encoding_, self.errors_))
+                self.binary_.flush()
+            else:
+                self.stream_.write(text)
+                self.stream_.flush()
+        except BrokenPipeError:
+            if self.stream_ is sys.stdout:
+                exit_on_broken_pipe()
+            raise
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,115 @@
+import multiprocessing
+import random
+import sys
+import threading
+
+# Number of characters read from the input per chunk (chunks are extended to the next newline)
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def add_arguments(parser):
+    """Add the --workers, --chunk-size and --unordered options used by run() to an argparse parser"""
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help="Process the input in chunks on N worker processes (default: stream in this process)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, metavar='CHARS',
+                        help="Approximate size of the chunks handed to the workers (default: {0:d})".format(
+                            DEFAULT_CHUNK_SIZE))
+    parser.add_argument('--unordered', action='store_true',
+                        help="Emit the output of each chunk as soon as it is ready instead of in input order")
+
+
+def read_chunks(fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generates (chunk_number, first_record, text) tuples of about chunk_size characters split on newline boundaries,
+    first_record is the number of records that precede the chunk.
+    """
+    chunk_number = 0
+    first_record = 0
+    while True:
+        text = fileobj.read(chunk_size)
+        if not text:
+            break
+        if not text.endswith('\n'):
+            text += fileobj.readline()
+        yield chunk_number, first_record, text
+        chunk_number += 1
+        first_record += text.count('\n') + (0 if text.endswith('\n') else 1)
+
+
+# --- Worker side --- #
+_processor = None
+_seed = None
+
+
+def _init_worker(processor, seed):
+    global _processor, _seed
+    _processor = processor
+    _seed = seed
+    if seed is None:
+        # Forked workers inherit the parent's PRNG state, so they would all draw the same values
+        random.seed()
+
+
+def _process_chunk(chunk):
+    chunk_number, first_record, text = chunk
+    if _seed is not None:
+        # Seed each chunk from (seed, chunk number) so the output does not depend on which worker ran it
+        random.seed('{0}:{1:d}'.format(_seed, chunk_number))
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return list(_processor(lines, first_record))
+
+
+def run(processor, fileobj=None, consumer=None, workers=0, chunk_size=DEFAULT_CHUNK_SIZE, ordered=True, seed=None):
+    """
+    Run the per-record body of a tool over a stream of delimited records (without its header).
+
+    :param processor: callable taking an iterable of lines and the number of records preceding them, and returning an
+        iterable of output items (by default, strings to write to stdout)
+    :param fileobj: input stream (default: stdin)
+    :param consumer: callable given an iterable of output items, once per chunk and in input order unless ordered is
+        False (default: write the items to stdout)
+    :param workers: 0 streams the input through the processor in this process, 1 or more splits it into chunks that
+        are processed by that many worker processes (1 processes the chunks in this process)
+    :param chunk_size: approximate number of characters per chunk
+    :param ordered: whether chunk results have to be consumed in input order
+    :param seed: PRNG seed, in chunked mode each chunk is seeded from (seed, chunk number), so that the output is
+        reproducible for a given seed and chunk size regardless of the number of workers
+    """
+    fileobj = sys.stdin if fileobj is None else fileobj
+    consumer = sys.stdout.writelines if consumer is None else consumer
+    if workers <= 0:
+        if seed is not None:
+            random.seed(seed)
+        consumer(processor(fileobj, 0))
+        return
+    chunks = read_chunks(fileobj, chunk_size)
+    if workers == 1:
+        _init_worker(processor, seed)
+        for chunk in chunks:
+            consumer(_process_chunk(chunk))
+        return
+    # Pool.imap reads its whole input ahead of the workers, so bound the number of chunks in flight
+    in_flight = threading.Semaphore(2 * workers)
+    stopped = threading.Event()
+
+    def throttled_chunks():
+        for chunk in chunks:
+            in_flight.acquire()
+            if stopped.is_set():
+                return
+            yield chunk
+
+    # The processor is usually a closure over the tool's state, fork hands it to the workers without pickling it
+    with multiprocessing.get_context('fork').Pool(workers, _init_worker, (processor, seed)) as pool:
+        try:
+            results = pool.imap(_process_chunk, throttled_chunks()) if ordered else \
+                pool.imap_unordered(_process_chunk, throttled_chunks())
+            for result in results:
+                in_flight.release()
+                consumer(result)
+        finally:
+            # If the consumer bailed out (e.g. on a broken pipe), unblock the pool's feeder thread so it can finish
+            stopped.set()
+            in_flight.release()
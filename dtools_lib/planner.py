@@ -0,0 +1,118 @@
+from dtools_lib.lazy import LazyDictionary
+
+
+class Step(object):
+    """
+    A provider in a generation plan.
+
+    keys are the keys the provider supplies, or a function returning them for a provider whose keys are only known
+    from its reference file: it is only called for a key starting with prefix that no step with a list of keys
+    supplies, so that unused files are never opened.  requires maps some of the keys to the keys (supplied by other
+    steps) that they depend on.  create() makes the provider, which is only done when one of its keys is needed, and
+    evaluate(provider, values, keys) returns a mapping holding (at least) the given keys, values holding the keys they
+    depend on.
+    """
+
+    def __init__(self, name, keys, create, evaluate=None, requires=None, prefix=''):
+        self.name = name
+        self.keys = None if callable(keys) else list(keys)
+        self.find_keys_ = keys if callable(keys) else None
+        self.prefix = prefix
+        self.create = create
+        self.evaluate = evaluate if evaluate is not None else lambda provider, values, keys: provider.generate()
+        self.requires = dict(requires or {})
+
+    def supplies(self, key):
+        if self.keys is None:
+            if not key.startswith(self.prefix):
+                return False
+            self.keys = list(self.find_keys_())
+        return key in self.keys
+
+    def dependencies(self, keys):
+        result = []
+        for key in keys:
+            for dependency in self.requires.get(key, []):
+                if dependency not in result:
+                    result.append(dependency)
+        return result
+
+
+class Plan(object):
+    """
+    The steps needed for a set of variables, in an order in which every step comes after the steps it depends on.  Each
+    variable is supplied by the first step (in the order the steps were given in) that lists it, or else by the first
+    step whose keys have to be looked up that supplies it.  Steps that no variable depends on are neither created nor
+    evaluated, and only the keys that are needed are read from the others.
+    """
+
+    def __init__(self, steps, variables):
+        self.steps_ = list(steps)
+        order = dict((step.name, i) for i, step in enumerate(self.steps_))
+        self.suppliers_ = {}
+        for step in self.steps_:
+            for key in step.keys or []:
+                self.suppliers_.setdefault(key, step)
+        supplier = self.supplier_
+
+        # Walk the dependencies from the variables, collecting the keys each step has to provide
+        wanted = {}
+        pending = list(variables)
+        while pending:
+            key = pending.pop(0)
+            step = supplier(key)
+            if step is None:
+                # Left in place, as Template.safe_substitute does
+                continue
+            keys = wanted.setdefault(step.name, [])
+            if key not in keys:
+                keys.append(key)
+                pending.extend(step.dependencies([key]))
+
+        # Topological sort, which keeps the given order of the steps where the dependencies allow it
+        needed = [step for step in self.steps_ if step.name in wanted]
+        after = dict((step.name, set(supplier(key).name for key in step.dependencies(wanted[step.name])))
+                     for step in needed)
+        self.order_ = []
+        done = set()
+        while len(self.order_) < len(needed):
+            ready = [step for step in needed if step.name not in done and after[step.name] <= done]
+            if not ready:
+                raise ValueError('Circular dependency between the providers ' +
+                                 ', '.join(step.name for step in needed if step.name not in done))
+            step = min(ready, key=lambda s: order[s.name])
+            self.order_.append((step, wanted[step.name]))
+            done.add(step.name)
+
+        self.providers_ = dict((step.name, step.create()) for step, _ in self.order_)
+
+    def supplier_(self, key):
+        if key not in self.suppliers_:
+            self.suppliers_[key] = None
+            for step in self.steps_:
+                if step.find_keys_ is not None and step.supplies(key):
+                    self.suppliers_[key] = step
+                    break
+        return self.suppliers_[key]
+
+    def names(self):
+        """The names of the steps that are evaluated, in order"""
+        return [step.name for step, _ in self.order_]
+
+    def set_provider(self, name, provider):
+        """Replace the provider of a step (if it is part of the plan)"""
+        if name in self.providers_:
+            self.providers_[name] = provider
+
+    def generate(self):
+        """Evaluate the plan once, giving a dict of the needed keys"""
+        values = {}
+        for step, keys in self.order_:
+            d = step.evaluate(self.providers_[step.name], values, keys)
+            if isinstance(d, LazyDictionary):
+                # Evaluates the keys in one call
+                values.update(d.materialize(keys))
+            else:
+                for key in keys:
+                    values[key] = d[key]
+        return values
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+# Bump when the layout of the cached objects changes (entries that no longer load are rebuilt anyway)
+FORMAT_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir():
+    """
+    Directory holding the cached reference data: $DTOOLS_CACHE_DIR, or dtools under $XDG_CACHE_HOME (by default
+    ~/.cache/dtools).  Setting DTOOLS_CACHE_DIR to an empty string disables the cache.  Entries are only ever added, a
+    new one for each change to a reference file: clear the cache by removing the directory (rm -r ~/.cache/dtools),
+    and the entries that are needed are rebuilt on the next run.
+
+    The entries are pickles, and loading a pickle can run arbitrary code: the cache is only used when the directory
+    belongs to the user and nobody else can write to it, so DTOOLS_CACHE_DIR cannot be shared between users.  The
+    directory is created accessible to its user only.
+    """
+    path = os.environ.get('DTOOLS_CACHE_DIR')
+    if path is None:
+        path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'dtools')
+    return path or None
+
+
+def is_private(directory):
+    """Whether a directory belongs to the user and cannot be written to by anybody else (or does not exist yet)"""
+    try:
+        st = os.stat(directory)
+    except FileNotFoundError:
+        return True
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o022
+
+
+def cache_path(directory, kind, filename, columns, sep):
+    # Any change to the file (as far as its modification time and size tell) or to the parameters gives a new entry
+    st = os.stat(filename)
+    key = repr((FORMAT_VERSION, kind, os.path.realpath(filename), st.st_mtime_ns, st.st_size, columns, sep))
+    return os.path.join(directory, kind + '-' + hashlib.sha256(key.encode('utf-8')).hexdigest() + '.pickle')
+
+
+def load(kind, filename, columns, sep, build):
+    """
+    Returns the object that build() makes out of a reference file, from an on-disk cache shared by all processes when
+    it holds an entry for the same file, columns and separator.  Otherwise the object is built and cached.  An entry
+    that cannot be loaded (truncated, or pickled from classes that have changed since) is logged and rebuilt.
+    """
+    directory = cache_dir()
+    if directory is None:
+        return build()
+    if not is_private(directory):
+        logger.warning('Not using the cache directory %s, as other users can write to it', directory)
+        return build()
+    try:
+        path = cache_path(directory, kind, filename, columns, sep)
+    except OSError:
+        return build()
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as ex:
+        logger.warning('Rebuilding the cache entry %s of %s: %s', path, filename, ex)
+    result = build()
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Write to a temporary file that replaces the entry at once, so that readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        # The cache is only an optimization, e.g. a read-only home directory just means no caching
+        pass
+    return result
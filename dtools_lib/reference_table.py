@@ -0,0 +1,198 @@
+import os
+import sys
+from collections.abc import Mapping
+
+import numpy
+
+from dtools_lib import delimited_record
+from dtools_lib import reference_cache
+
+
+class ReferenceTable(object):
+    """
+    A delimited reference file held a column at a time (of interned strings, so that each distinct value is only held
+    once), optionally grouped by the value of a key column.  The rows of a grouped table are sorted by their key
+    (keeping their order in the file within a group), so that the rows of group g are the range
+    [starts_[g], starts_[g] + counts_[g]) and drawing a row of a group is drawing an index.
+    """
+
+    # Everything a table holds, which a snapshot has to hold exactly to be loaded
+    ATTRIBUTES = frozenset(['header_', 'index_', 'key_', 'groups_', 'group_index_', 'counts_', 'starts_', 'columns_',
+                            'num_rows_', 'joined_', 'value_rows_'])
+
+    def __init__(self, fileobj, key=None, sep='|', ragged=False):
+        """
+        A row with more or fewer fields than the header raises ValueError, unless ragged is true: its extra fields are
+        then dropped and its missing fields are empty.
+        """
+        self.header_ = fileobj.readline().rstrip().split(sep)
+        self.index_ = dict((field, i) for i, field in enumerate(self.header_))
+        if ragged:
+            num_fields = len(self.header_)
+            rows = [row if len(row) == num_fields else (row + [''] * num_fields)[:num_fields]
+                    for row in delimited_record.read_delimited(fileobj, sep)]
+        else:
+            rows = list(delimited_record.read_rows(fileobj, self.header_, sep))
+        self.key_ = key
+        self.groups_ = []
+        counts = []
+        if key is not None:
+            k = self.index_[key]
+            rows.sort(key=lambda row: row[k])
+            for row in rows:
+                if not self.groups_ or row[k] != self.groups_[-1]:
+                    self.groups_.append(row[k])
+                    counts.append(0)
+                counts[-1] += 1
+        self.group_index_ = dict((group, g) for g, group in enumerate(self.groups_))
+        self.counts_ = numpy.array(counts, dtype=numpy.int64)
+        self.starts_ = numpy.cumsum(self.counts_) - self.counts_
+        intern = sys.intern
+        self.columns_ = [[intern(value) for value in column] for column in zip(*rows)] if rows else \
+            [[] for _ in self.header_]
+        self.num_rows_ = len(rows)
+        self.joined_ = {}
+        self.value_rows_ = {}
+
+    def __setstate__(self, state):
+        # A snapshot of another layout raises, so that the reference cache rebuilds it
+        if set(state) != ReferenceTable.ATTRIBUTES:
+            raise ValueError('snapshot of another ReferenceTable layout')
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return self.num_rows_
+
+    def keys(self):
+        return list(self.header_)
+
+    def column(self, name):
+        return self.columns_[self.index_[name]]
+
+    def get(self, i, name):
+        return self.columns_[self.index_[name]][i]
+
+    def row(self, i):
+        return [column[i] for column in self.columns_]
+
+    def view(self, i, index=None):
+        """Row i as a RowView, with the field names of index (a dict of name to column) instead of the header's"""
+        return RowView(self.columns_, self.index_ if index is None else index, i)
+
+    def joined(self, columns, sep='|'):
+        """The given columns of each row joined into one string, made once for each (columns, sep)"""
+        key = (tuple(columns), sep)
+        if key not in self.joined_:
+            self.joined_[key] = [sep.join(fields) for fields in zip(*[self.column(name) for name in columns])]
+        return self.joined_[key]
+
+    def groups(self):
+        """The distinct values of the key column, in sorted order"""
+        return list(self.groups_)
+
+    def group(self, value):
+        """Index of the group of rows whose key is value"""
+        return self.group_index_[value]
+
+    def group_range(self, g):
+        """The rows [start, end) of group g"""
+        start = int(self.starts_[g])
+        return start, start + int(self.counts_[g])
+
+    def all_rows(self):
+        """All the rows, as a list of (start, end) ranges"""
+        return [(0, self.num_rows_)] if self.num_rows_ else []
+
+    def group_rows(self, value):
+        """The rows of the group whose key is value, as a list of (start, end) ranges"""
+        g = self.group_index_.get(value)
+        return [] if g is None else [self.group_range(g)]
+
+    def rows_where(self, name, value):
+        """The rows whose column name holds value, as a list of (start, end) ranges"""
+        if name not in self.value_rows_:
+            # Indexed the first time a column is asked for
+            by_value = {}
+            for i, v in enumerate(self.column(name)):
+                ranges = by_value.setdefault(v, [])
+                if ranges and ranges[-1][1] == i:
+                    ranges[-1][1] = i + 1
+                else:
+                    ranges.append([i, i + 1])
+            self.value_rows_[name] = dict((v, [tuple(r) for r in ranges]) for v, ranges in by_value.items())
+        return self.value_rows_[name].get(value, [])
+
+    def choose(self, randbelow, rows, excluded=()):
+        """
+        Index of a row drawn uniformly from rows leaving out excluded (both lists of (start, end) ranges), with a single
+        randbelow(n) giving an integer in range(n): no row is ever drawn again.  None when no row is left.
+        """
+        ranges = subtract_ranges(rows, excluded)
+        n = sum(end - start for start, end in ranges)
+        if n == 0:
+            return None
+        i = randbelow(n)
+        for start, end in ranges:
+            if i < end - start:
+                return start + i
+            i -= end - start
+
+    def draw(self, rng, groups):
+        """Indexes of a row drawn uniformly from each of the given groups (a NumPy array of group indexes)"""
+        return self.starts_[groups] + (rng.random(len(groups)) * self.counts_[groups]).astype(numpy.int64)
+
+
+def subtract_ranges(ranges, excluded):
+    """The (start, end) ranges of rows left of ranges once the rows in excluded (any list of ranges) are taken out"""
+    result = []
+    excluded = sorted(excluded)
+    for start, end in sorted(ranges):
+        for excluded_start, excluded_end in excluded:
+            if excluded_end <= start or excluded_start >= end:
+                continue
+            if excluded_start > start:
+                result.append((start, excluded_start))
+            start = max(start, excluded_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+class RowView(Mapping):
+    """A row of a ReferenceTable as a read-only mapping, whose values are looked up in the table's columns"""
+    __slots__ = ('columns_', 'index_', 'row_')
+
+    def __init__(self, columns, index, row):
+        self.columns_ = columns
+        self.index_ = index
+        self.row_ = row
+
+    def __getitem__(self, key):
+        return self.columns_[self.index_[key]][self.row_]
+
+    def __contains__(self, key):
+        return key in self.index_
+
+    def __iter__(self):
+        return iter(self.index_)
+
+    def __len__(self):
+        return len(self.index_)
+
+    def __repr__(self):
+        return 'RowView({0!r})'.format(dict(self.items()))
+
+
+def load_table(fileobj, key=None, sep='|', ragged=False):
+    """
+    ReferenceTable of a reference file, loaded from its binary snapshot in the reference cache (see
+    dtools_lib.reference_cache for where it is kept) when the file has not changed since the snapshot was made (in
+    which case fileobj is not read).  Otherwise the table is built and snapshotted.
+    """
+    filename = getattr(fileobj, 'name', None)
+    if not isinstance(filename, str) or not os.path.isfile(filename):
+        return ReferenceTable(fileobj, key, sep, ragged)
+    return reference_cache.load('table', filename, (key, ragged), sep,
+                                lambda: ReferenceTable(fileobj, key, sep, ragged))
@@ -0,0 +1,216 @@
+import heapq
+import math
+from array import array
+from hashlib import blake2b
+
+# Number of counters kept for the most frequent values
+DEFAULT_CAPACITY = 2000
+
+
+def hash128(value):
+    """Stable 128 bit hash of a string (unlike hash(), it is the same in every process)"""
+    return int.from_bytes(blake2b(value.encode('utf-8', 'surrogateescape'), digest_size=16).digest(), 'little')
+
+
+class HyperLogLog(object):
+    """
+    Estimates the number of distinct values added to it in 2**precision bytes, with a relative standard error of about
+    1.04 / sqrt(2**precision) (0.8% with the default precision) over the whole range of cardinalities.  The estimate is
+    computed from the histogram of the registers (Ertl, "New cardinality estimation algorithms for HyperLogLog
+    sketches", 2017), which has none of the bias of the raw HyperLogLog estimate for cardinalities up to a few times
+    the number of registers.
+    """
+
+    def __init__(self, precision=14):
+        self.precision_ = precision
+        self.num_registers_ = 1 << precision
+        self.registers_ = bytearray(self.num_registers_)
+
+    def add_hash(self, h):
+        # The first precision bits of a 64 bit hash select the register, the rank of the first 1 bit in the remaining
+        # bits is kept in the register if it is the largest seen so far
+        h &= 0xFFFFFFFFFFFFFFFF
+        width = 64 - self.precision_
+        index = h >> width
+        rank = width - (h & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers_[index]:
+            self.registers_[index] = rank
+
+    def add(self, value):
+        self.add_hash(hash128(value))
+
+    def cardinality(self):
+        m = self.num_registers_
+        q = 64 - self.precision_
+        histogram = [0] * (q + 2)
+        for r in self.registers_:
+            histogram[r] += 1
+        if histogram[0] == m:
+            return 0
+        z = m * _tau(1.0 - histogram[q + 1] / float(m))
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / float(m))
+        return int(round(m * m / (2 * math.log(2) * z)))
+
+    def merge(self, other):
+        """Add the values counted by another HyperLogLog of the same precision"""
+        self.registers_ = bytearray(map(max, self.registers_, other.registers_))
+
+
+def _sigma(x):
+    # sum of x**(2**k) * 2**(k-1) for k >= 1, plus x: corrects for the registers that are still empty
+    if x == 1.0:
+        return float('inf')
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    # Corrects for the registers that have reached the largest rank the hash can give
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == previous:
+            return z / 3.0
+
+
+class CountMinSketch(object):
+    """
+    Estimates how often each value was added, never underestimating it.  With the default dimensions the overestimate
+    is at most 2e-4 of the total count with 98% probability.
+    """
+
+    def __init__(self, width=1 << 14, depth=4):
+        self.width_ = width
+        self.depth_ = depth
+        self.rows_ = [array('q', bytes(8 * width)) for _ in range(depth)]
+        self.total_ = 0
+
+    def indexes_(self, h):
+        # Double hashing of the upper 64 bits of the hash gives the position in each row
+        h1 = (h >> 64) & 0xFFFFFFFF
+        h2 = h >> 96
+        return [(h1 + i * h2) % self.width_ for i in range(self.depth_)]
+
+    def add_hash(self, h, count=1):
+        for row, i in zip(self.rows_, self.indexes_(h)):
+            row[i] += count
+        self.total_ += count
+
+    def add(self, value, count=1):
+        self.add_hash(hash128(value), count)
+
+    def estimate_hash(self, h):
+        return min(row[i] for row, i in zip(self.rows_, self.indexes_(h)))
+
+    def estimate(self, value):
+        return self.estimate_hash(hash128(value))
+
+    def error_bound(self):
+        """Largest overestimate of a count (with 1 - e**-depth probability)"""
+        return math.e / self.width_ * self.total_
+
+    def merge(self, other):
+        """Add the counts of another CountMinSketch of the same dimensions"""
+        self.total_ += other.total_
+        for row, other_row in zip(self.rows_, other.rows_):
+            for i, count in enumerate(other_row):
+                if count:
+                    row[i] += count
+
+
+class SpaceSaving(object):
+    """
+    Keeps the (approximately) most frequent values in a fixed number of counters.  A value that is not counted takes
+    over the smallest counter, so counts can be overestimated by at most that counter's value, and every value more
+    frequent than total / capacity is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity_ = capacity
+        self.counts_ = {}
+        # Min-heap of (count, value), entries whose count is out of date are skipped when popped
+        self.heap_ = []
+
+    def add(self, value, count=1):
+        counts = self.counts_
+        if value in counts:
+            counts[value] += count
+        elif len(counts) < self.capacity_:
+            counts[value] = count
+        else:
+            heap = self.heap_
+            while True:
+                minimum, evicted = heapq.heappop(heap)
+                if counts.get(evicted) == minimum:
+                    break
+            del counts[evicted]
+            counts[value] = minimum + count
+        heapq.heappush(self.heap_, (counts[value], value))
+        if len(self.heap_) > 4 * self.capacity_:
+            self.heap_ = [(c, v) for v, c in counts.items()]
+            heapq.heapify(self.heap_)
+
+    def most_common(self, limit=None):
+        """List of (value, count) pairs in decreasing order of count"""
+        items = sorted(self.counts_.items(), key=lambda item: item[1], reverse=True)
+        return items if limit is None else items[:limit]
+
+    def merge(self, other):
+        """Add the counters of another SpaceSaving, keeping the largest ones"""
+        counts = self.counts_
+        for value, count in other.counts_.items():
+            counts[value] = counts.get(value, 0) + count
+        if len(counts) > self.capacity_:
+            self.counts_ = dict(self.most_common(self.capacity_))
+        self.heap_ = [(c, v) for v, c in self.counts_.items()]
+        heapq.heapify(self.heap_)
+
+
+class ValueSketch(object):
+    """
+    Fixed size summary of a column's values: its number of distinct values (HyperLogLog) and its most frequent values
+    (Space-Saving, with the counts tightened by a Count-Min sketch).  Only values counted more often than the Count-Min
+    sketch can overestimate are listed as most frequent, so a column of (nearly) unique values has none.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.distinct_ = HyperLogLog()
+        self.frequencies_ = CountMinSketch()
+        self.top_ = SpaceSaving(capacity)
+
+    def add(self, value, count=1):
+        h = hash128(value)
+        self.distinct_.add_hash(h)
+        self.frequencies_.add_hash(h, count)
+        self.top_.add(value, count)
+
+    def cardinality(self):
+        return self.distinct_.cardinality()
+
+    def merge(self, other):
+        self.distinct_.merge(other.distinct_)
+        self.frequencies_.merge(other.frequencies_)
+        self.top_.merge(other.top_)
+
+    def most_common(self, limit=None):
+        """List of (value, estimated count) pairs in decreasing order of estimated count"""
+        bound = self.frequencies_.error_bound()
+        items = [(v, min(c, self.frequencies_.estimate(v))) for v, c in self.top_.most_common()]
+        items = [item for item in items if item[1] > bound]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items if limit is None else items[:limit]
@@ -0,0 +1,123 @@
+import heapq
+import sys
+import tempfile
+
+# Number of temporary files merged at a time
+MERGE_WIDTH = 64
+
+
+def temporary_file(dir=None):
+    """Anonymous text mode temporary file, removed as soon as it is closed"""
+    return tempfile.TemporaryFile('w+', dir=dir, encoding='utf-8', errors='surrogateescape', newline='\n')
+
+
+def read_lines(fileobj):
+    """Generates the lines of a temporary file from its start, without their newline"""
+    fileobj.seek(0)
+    for line in fileobj:
+        yield line[:-1]
+
+
+def merge_lines(files, key=None):
+    """Generates the lines of temporary files that are each sorted (by key), in sorted order"""
+    return heapq.merge(*[read_lines(f) for f in files], key=key)
+
+
+def merge_runs(runs, key=None, reverse=False, dir=None):
+    """Merges sorted temporary files (in input order, so that the merge is stable) into a new one, closing them"""
+    f = temporary_file(dir)
+    f.writelines(line + '\n' for line in heapq.merge(*[read_lines(r) for r in runs], key=key, reverse=reverse))
+    for r in runs:
+        r.close()
+    return f
+
+
+def sort_lines(lines, key=None, reverse=False, max_size=1 << 28, dir=None):
+    """
+    External merge sort: generates the lines sorted (stably) by key.  Runs of lines taking up to about max_size bytes
+    (sys.getsizeof of the strings and their list slots) are sorted in memory and written to temporary files, which are
+    then merged.  The keys made while sorting a run come on top of that, typically as much again for keys holding
+    fields of the lines.
+
+    Runs are merged in levels, MERGE_WIDTH runs of a level making one run of the next level, so that every line is
+    written out once per level (a logarithmic number of times) and no more than MERGE_WIDTH files are merged at once.
+    """
+    lines = iter(lines)
+    # levels[k] holds the runs of level k in input order, all of them later in the input than those of level k + 1
+    levels = []
+    try:
+        while True:
+            run = []
+            size = 0
+            for line in lines:
+                run.append(line)
+                size += sys.getsizeof(line) + 8
+                if size >= max_size:
+                    break
+            run.sort(key=key, reverse=reverse)
+            if not levels and size < max_size:
+                # Everything fit in memory
+                for line in run:
+                    yield line
+                return
+            if not run:
+                break
+            f = temporary_file(dir)
+            f.writelines(line + '\n' for line in run)
+            run = None
+            level = 0
+            while True:
+                if level == len(levels):
+                    levels.append([])
+                levels[level].append(f)
+                if len(levels[level]) < MERGE_WIDTH:
+                    break
+                f = merge_runs(levels[level], key, reverse, dir)
+                levels[level] = []
+                level += 1
+            if size < max_size:
+                break
+        # Oldest runs first, from the highest level down
+        runs = [f for level in reversed(levels) for f in level]
+        while len(runs) > MERGE_WIDTH:
+            # Too many files to open at once: merge the latest ones into one
+            runs = runs[:-MERGE_WIDTH] + [merge_runs(runs[-MERGE_WIDTH:], key, reverse, dir)]
+            levels = [runs]
+        for line in heapq.merge(*[read_lines(f) for f in runs], key=key, reverse=reverse):
+            yield line
+    finally:
+        for level in levels:
+            for f in level:
+                if not f.closed:
+                    f.close()
+
+
+class Partitions(object):
+    """
+    A fixed number of temporary files that lines are distributed over by the hash of a key, so that all the lines with
+    the same key end up in the same partition (in the order they were written).  Partitions with different seeds
+    distribute the keys differently, so that the lines of one partition can be spread over another set of partitions.
+    """
+
+    def __init__(self, num_partitions, dir=None, seed=0):
+        self.files_ = [temporary_file(dir) for _ in range(num_partitions)]
+        self.seed_ = seed
+
+    def __len__(self):
+        return len(self.files_)
+
+    def write(self, key, line):
+        self.files_[hash((self.seed_, key)) % len(self.files_)].write(line + '\n')
+
+    def read(self, partition):
+        return read_lines(self.files_[partition])
+
+    def close(self):
+        for f in self.files_:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,48 @@
+from string import Template
+
+
+class CompiledTemplate(object):
+    """
+    A string.Template split once into its literal text and its variable slots, so that filling it in is a single join.
+    As with Template.safe_substitute, variables without a value (and delimiters not followed by a name) are left as
+    they are.
+    """
+
+    def __init__(self, template):
+        t = Template(template)
+        # parts_ alternates literal text and placeholders, slots_ holds the (index in parts_, name) of the placeholders
+        self.parts_ = []
+        self.slots_ = []
+        literal = []
+        position = 0
+        for match in t.pattern.finditer(template):
+            literal.append(template[position:match.start()])
+            position = match.end()
+            if match.group('invalid') is not None:
+                # A delimiter not followed by a name is kept, as Template.safe_substitute does
+                literal.append(match.group())
+                continue
+            if match.group('escaped') is not None:
+                literal.append(t.delimiter)
+                continue
+            self.parts_.append(''.join(literal))
+            literal = []
+            self.slots_.append((len(self.parts_), match.group('named') or match.group('braced')))
+            self.parts_.append(match.group())
+        literal.append(template[position:])
+        self.parts_.append(''.join(literal))
+
+    def variables(self):
+        """The names of the variables in the template, in the order in which they first occur"""
+        result = []
+        for _, name in self.slots_:
+            if name not in result:
+                result.append(name)
+        return result
+
+    def render(self, values):
+        parts = list(self.parts_)
+        for i, name in self.slots_:
+            if name in values:
+                parts[i] = str(values[name])
+        return ''.join(parts)
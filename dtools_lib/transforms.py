@@ -4,6 +4,8 @@ import random
 import string
 import time
 import datetime
+import functools
+import re
 import unicodedata
 import uuid
 from collections import defaultdict
@@ -12,6 +14,7 @@ import phonenumbers
 from faker import Factory
 
 from dtools_lib import delimited_record
+from dtools_lib import reference_cache
 
 OBJECT_CACHE_ = {}
 
@@ -168,75 +171,50 @@ def Insert(s, s2, pos=0):
     return s[:pos] + s2 + s[pos:]
 
 
-def Pattern(s):
-    pattern = ''
-    alpha = 0
-    digit = 0
-    punct = 0
-    space = 0
-    for c in s:
+class _PatternClasses(dict):
+    """
+    str.translate table mapping every character to its Pattern class: L(etter), D(igit), ' ' (space) or P(unctuation).
+    Characters are classified on first use, so the table only ever holds the characters that were seen.
+    """
+
+    def __missing__(self, code):
+        c = chr(code)
         if c.isalpha():
-            if alpha == 0:
-                if digit > 0:
-                    pattern += 'D' if digit == 1 else 'D+'
-                    digit = 0
-                elif punct > 0:
-                    pattern += 'P' if punct == 1 else 'P+'
-                    punct = 0
-                elif space > 0:
-                    pattern += ' '
-                    space = 0
-            alpha += 1
+            cls = 'L'
         elif c.isdigit():
-            if digit == 0:
-                if alpha > 0:
-                    pattern += 'L' if alpha == 1 else 'L+'
-                    alpha = 0
-                elif punct > 0:
-                    pattern += 'P' if punct == 1 else 'P+'
-                    punct = 0
-                elif space > 0:
-                    pattern += ' '
-                    space = 0
-            digit += 1
+            cls = 'D'
         elif c.isspace():
-            if space == 0:
-                if alpha > 0:
-                    pattern += 'L' if alpha == 1 else 'L+'
-                    alpha = 0
-                elif punct > 0:
-                    pattern += 'P' if punct == 1 else 'P+'
-                    punct = 0
-                elif digit > 0:
-                    pattern += 'D' if digit == 1 else 'D+'
-                    digit = 0
-            space += 1
+            cls = ' '
         else:
-            if punct == 0:
-                if alpha > 0:
-                    pattern += 'L' if alpha == 1 else 'L+'
-                    alpha = 0
-                elif digit > 0:
-                    pattern += 'D' if digit == 1 else 'D+'
-                    digit = 0
-                elif space > 0:
-                    pattern += ' '
-                    space = 0
-            punct += 1
-    if alpha > 0:
-        pattern += 'L' if alpha == 1 else 'L+'
-    elif digit > 0:
-        pattern += 'D' if digit == 1 else 'D+'
-    elif punct > 0:
-        pattern += 'P' if punct == 1 else 'P+'
-    elif space > 0:
-        pattern += ' '
+            cls = 'P'
+        self[code] = cls
+        return cls
+
+
+_PATTERN_CLASSES = _PatternClasses()
+_PATTERN_REPEATS = re.compile(r'([LDP])\1+')
+_PATTERN_SPACES = re.compile(r'  +')
+# Patterns of the character class strings seen so far, profiled columns only have a handful of distinct class strings
+_PATTERN_CACHE = {}
+_PATTERN_CACHE_SIZE = 1 << 16
+
+
+def Pattern(s):
+    classes = s.translate(_PATTERN_CLASSES)
+    pattern = _PATTERN_CACHE.get(classes)
+    if pattern is None:
+        # A run of letters, digits or punctuation becomes L, D or P when it is a single character, L+, D+ or P+
+        # otherwise, and a run of white space becomes a single space
+        pattern = _PATTERN_SPACES.sub(' ', _PATTERN_REPEATS.sub(r'\1+', classes))
+        if len(_PATTERN_CACHE) >= _PATTERN_CACHE_SIZE:
+            _PATTERN_CACHE.clear()
+        _PATTERN_CACHE[classes] = pattern
     return pattern
 
 
 def MD5(s):
     m = hashlib.md5()
-    m.update(s)
+    m.update(s.encode('utf-8') if isinstance(s, str) else s)
     return m.hexdigest()
 
 
@@ -410,31 +388,37 @@ def Haversine(lon1, lat1, lon2, lat2):
 def CreateMap(filename, key, value, sep='|'):
     object_key = '__MAP__:' + '\t'.join([filename, key, value])
     if object_key not in OBJECT_CACHE_:
-        m = {}
-        with open(filename) as fin:
-            for rec in delimited_record.read_records(fin, sep=sep):
-                m[rec[key]] = rec[value]
-        OBJECT_CACHE_[object_key] = m
+        def build():
+            m = {}
+            with open(filename) as fin:
+                for rec in delimited_record.read_records(fin, sep=sep):
+                    m[rec[key]] = rec[value]
+            return m
+        OBJECT_CACHE_[object_key] = reference_cache.load('map', filename, (key, value), sep, build)
     return object_key
 
 
 def CreateList(filename, key=None, sep='|'):
     object_key = '__LIST__:' + filename if key is None else '\t'.join([filename, key])
     if object_key not in OBJECT_CACHE_:
-        with open(filename) as fin:
-            OBJECT_CACHE_[object_key] = [line.rstrip() for line in fin] if key is None else \
-                [rec[key] for rec in delimited_record.read_records(fin, sep=sep)]
+        def build():
+            with open(filename) as fin:
+                return [line.rstrip() for line in fin] if key is None else \
+                    [rec[key] for rec in delimited_record.read_records(fin, sep=sep)]
+        OBJECT_CACHE_[object_key] = reference_cache.load('list', filename, (key,), sep, build)
     return object_key
 
 
 def CreateMultiMap(filename, key, value, sep='|'):
     object_key = '__MULTIMAP__:' + '\t'.join([filename, key, value])
     if object_key not in OBJECT_CACHE_:
-        with open(filename) as fin:
-            m = defaultdict(list)
-            for rec in delimited_record.read_records(fin, sep=sep):
-                m[rec[key]].append(rec[value])
-                OBJECT_CACHE_[object_key] = m
+        def build():
+            with open(filename) as fin:
+                m = defaultdict(list)
+                for rec in delimited_record.read_records(fin, sep=sep):
+                    m[rec[key]].append(rec[value])
+            return m
+        OBJECT_CACHE_[object_key] = reference_cache.load('multimap', filename, (key, value), sep, build)
     return object_key
 
 
@@ -508,7 +492,7 @@ class DecompositionMap(dict):
         ch = self.get(key)
         if ch is not None:
             return ch
-        de = unicodedata.decomposition(unichr(key))
+        de = unicodedata.decomposition(chr(key))
         if de:
             try:
                 ch = int(de.split(None, 1)[0], 16)
@@ -526,7 +510,9 @@ DECOMPOSITION_MAP_ = DecompositionMap()
 
 
 def ToAscii(utf_string):
-    return utf_string.decode('utf-8').translate(DECOMPOSITION_MAP_).encode('ascii', 'ignore')
+    if isinstance(utf_string, bytes):
+        utf_string = utf_string.decode('utf-8')
+    return utf_string.translate(DECOMPOSITION_MAP_).encode('ascii', 'ignore').decode('ascii')
 
 
 # --- Standardization functions --- #
@@ -569,3 +555,60 @@ def GenerateDate(object_key):
 
 def GenerateDateBetween(object_key, start_date='-30y', end_date='now', format='%Y-%m-%d', tzinfo=None):
     return OBJECT_CACHE_[object_key].date_time_between(start_date, end_date, tzinfo).strftime(format)
+
+
+# --- Function registry --- #
+# Functions whose result depends on more than their arguments (the current record, the clock or a PRNG) and that must
+# therefore be called every time: they are never memoized, nor folded into constants or shared as common subexpressions
+VOLATILE_FUNCTIONS = frozenset([
+    'Field', 'RecordCount', 'FieldCount', 'EpochTime', 'PowerSet', 'Uuid', 'Shuffle', 'TransposeRandomBytes', 'PickOne',
+])
+
+
+def is_volatile(fn_name):
+    return fn_name in VOLATILE_FUNCTIONS or fn_name.startswith('Random') or fn_name.startswith('Generate')
+
+
+# Pure functions that are expensive enough for a cache of their results to pay off on repetitive columns (Pattern has
+# a cache of its own)
+MEMOIZED_FUNCTIONS = ('MD5', 'StringToEpoch', 'EpochToString', 'DayDelta', 'ToAscii', 'StandardizePhone')
+DEFAULT_MEMO_SIZE = 1 << 16
+_UNMEMOIZED_FUNCTIONS = {}
+
+
+def memoize(maxsize=DEFAULT_MEMO_SIZE, names=MEMOIZED_FUNCTIONS):
+    """
+    Replace the given functions of this module by versions that keep the results of their last maxsize distinct calls
+    (0 restores the plain functions).  Expressions resolve their functions when they are compiled, so call it first.
+    """
+    module = globals()
+    for name in names:
+        if is_volatile(name):
+            raise ValueError('{0} is not a pure function and cannot be memoized'.format(name))
+        fn = _UNMEMOIZED_FUNCTIONS.setdefault(name, module[name])
+        module[name] = _memoized(fn, maxsize) if maxsize > 0 else fn
+
+
+def _memoized(fn, maxsize):
+    # Calls with an unhashable argument (such as a list) are not cached
+    cached = functools.lru_cache(maxsize)(fn)
+
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        try:
+            return cached(*args, **kwargs)
+        except TypeError:
+            try:
+                hash((args, tuple(kwargs.items())))
+            except TypeError:
+                return fn(*args, **kwargs)
+            raise
+    call.cache_info = cached.cache_info
+    return call
+
+
+def memo_info():
+    """The hits, misses and current size of the cache of each memoized function"""
+    return dict((name, globals()[name].cache_info()) for name in _UNMEMOIZED_FUNCTIONS
+                if hasattr(globals()[name], 'cache_info'))
+
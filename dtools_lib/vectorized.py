@@ -0,0 +1,187 @@
+import functools
+import operator
+
+import numpy
+
+from dtools_lib import transforms
+
+
+# --- Column helpers --- #
+# A column is a list (as read from the input) or a numpy array (as produced by the numeric kernels), anything else is
+# a scalar that applies to every row of the batch.
+def is_column(value):
+    return isinstance(value, (list, numpy.ndarray))
+
+
+def column(value, n):
+    """Broadcast a scalar to a list of n values, columns are returned as they are"""
+    return value if is_column(value) else [value] * n
+
+
+def to_list(value):
+    return value.tolist() if isinstance(value, numpy.ndarray) else value
+
+
+def to_array(value):
+    """
+    Convert a list column into an object array, so that numpy operators apply the Python semantics of the elements
+    (e.g. string concatenation, arbitrary precision integers).  Arrays and scalars are returned as they are.
+    """
+    if not isinstance(value, list):
+        return value
+    result = numpy.empty(len(value), dtype=object)
+    result[:] = value
+    return result
+
+
+def as_mask(value, n):
+    """Convert a column (or a scalar) into a boolean array using Python truthiness"""
+    if isinstance(value, numpy.ndarray):
+        return value if value.dtype == numpy.bool_ else value.astype(numpy.bool_)
+    if isinstance(value, list):
+        return numpy.fromiter(map(bool, value), dtype=numpy.bool_, count=len(value))
+    return numpy.full(n, bool(value), dtype=numpy.bool_)
+
+
+def apply(fn, n, args):
+    """Fallback for functions without a kernel: call the scalar function once per row"""
+    if not args:
+        return [fn() for _ in range(n)]
+    return [fn(*row) for row in zip(*[to_list(column(arg, n)) for arg in args])]
+
+
+# --- Kernels --- #
+# Kernels take the batch size followed by the arguments of the scalar function in transforms, at least one of which is
+# a column, and return a column with the same values the scalar function would have produced for each row.
+def _string_kernel(method):
+    def kernel(n, s):
+        return [method(v) for v in to_list(s)]
+    return kernel
+
+
+# Results of int64 arithmetic at least this large (as estimated in float64) may have wrapped around
+INT64_LIMIT = 2.0 ** 62
+
+
+def as_objects(value):
+    """Convert a column into an object array of Python values (e.g. int64 into arbitrary precision integers)"""
+    if isinstance(value, numpy.ndarray):
+        return value if value.dtype == object else value.astype(object)
+    return to_array(value)
+
+
+def exact(op, a, b):
+    """
+    op(a, b) with numpy's fixed-width integers, redone with Python integers when the result could have overflowed
+    (numpy wraps around silently where Python would have given a larger integer)
+    """
+    try:
+        result = op(a, b)
+    except OverflowError:
+        # A Python integer constant out of the range of int64
+        return op(as_objects(a), as_objects(b))
+    if isinstance(result, numpy.ndarray) and result.dtype.kind in 'iu':
+        estimate = op(numpy.asarray(a, dtype=numpy.float64), numpy.asarray(b, dtype=numpy.float64))
+        if numpy.any(numpy.abs(estimate) >= INT64_LIMIT):
+            return op(as_objects(a), as_objects(b))
+    return result
+
+
+def _binary_kernel(op):
+    def kernel(n, a, b):
+        return exact(op, to_array(a), to_array(b))
+    return kernel
+
+
+def _reduce_kernel(op):
+    def kernel(n, *args):
+        return functools.reduce(lambda a, b: exact(op, a, b), [to_array(arg) for arg in args])
+    return kernel
+
+
+def _checked_division_kernel(op):
+    def kernel(n, a, b):
+        b = to_array(b)
+        if numpy.any(b == 0):
+            raise ZeroDivisionError('division by zero')
+        return op(to_array(a), b)
+    return kernel
+
+
+def Integer(n, s):
+    s = to_list(s)
+    try:
+        return numpy.fromiter(map(int, s), dtype=numpy.int64, count=len(s))
+    except OverflowError:
+        return to_array([int(v) for v in s])
+
+
+def Float(n, s):
+    s = to_list(s)
+    return numpy.fromiter(map(float, s), dtype=numpy.float64, count=len(s))
+
+
+def Pattern(n, s):
+    # Profiled columns are highly repetitive, so compute the pattern once per distinct value in the batch
+    s = to_list(s)
+    patterns = dict((v, transforms.Pattern(v)) for v in set(s))
+    return [patterns[v] for v in s]
+
+
+def Lookup(n, s, map_key, default=None):
+    if is_column(map_key) or is_column(default):
+        return apply(transforms.Lookup, n, [s, map_key, default])
+    get = transforms.OBJECT_CACHE_[map_key].get
+    if default is None:
+        return [get(v, v) for v in to_list(s)]
+    return [get(v, default) for v in to_list(s)]
+
+
+def All(n, *args):
+    return numpy.logical_and.reduce([as_mask(arg, n) for arg in args])
+
+
+def Any(n, *args):
+    return numpy.logical_or.reduce([as_mask(arg, n) for arg in args])
+
+
+def Haversine(n, lon1, lat1, lon2, lat2):
+    r = 6371  # Radius of earth in kilometers. Use 3956 for miles
+
+    args = [numpy.asarray(x) for x in (lon1, lat1, lon2, lat2)]
+    if any(arg.dtype.kind not in 'biuf' for arg in args):
+        # Not all numbers (e.g. strings read from the input): the scalar function raises the same errors
+        return apply(transforms.Haversine, n, [lon1, lat1, lon2, lat2])
+    lon1, lat1, lon2, lat2 = [numpy.radians(arg.astype(numpy.float64)) for arg in args]
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = numpy.sin(dlat / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin(dlon / 2) ** 2
+    return 2 * numpy.arcsin(numpy.sqrt(a)) * r
+
+
+KERNELS = {
+    'ToUpper': _string_kernel(str.upper),
+    'ToLower': _string_kernel(str.lower),
+    'Strip': _string_kernel(str.strip),
+    'LStrip': _string_kernel(str.lstrip),
+    'RStrip': _string_kernel(str.rstrip),
+    'Length': _string_kernel(len),
+    'Integer': Integer,
+    'Float': Float,
+    'Pattern': Pattern,
+    'Lookup': Lookup,
+    'Equals': _binary_kernel(operator.eq),
+    'NotEquals': _binary_kernel(operator.ne),
+    'LessThan': _binary_kernel(operator.lt),
+    'LessThanOrEquals': _binary_kernel(operator.le),
+    'GreaterThan': _binary_kernel(operator.gt),
+    'GreaterThanOrEquals': _binary_kernel(operator.ge),
+    'All': All,
+    'Any': Any,
+    'Sum': _reduce_kernel(operator.add),
+    'Product': _reduce_kernel(operator.mul),
+    'Subtract': _binary_kernel(operator.sub),
+    'Divide': _checked_division_kernel(operator.truediv),
+    'Remainder': _checked_division_kernel(operator.mod),
+    'Haversine': Haversine,
+}
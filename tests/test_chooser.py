@@ -0,0 +1,94 @@
+import bisect
+import itertools
+import random
+from collections import Counter
+
+import pytest
+
+from dtools_lib.chooser import Chooser, GaussianChooser, WeightedChooser
+
+WEIGHTS = [('a', 5), ('b', 0), ('c', 0.5), ('d', 12), ('e', 1), ('f', 3.25)]
+
+
+def test_truncated_values_are_in_range():
+    random.seed(0)
+    chooser = GaussianChooser(0, 1, minimum=-0.5, maximum=2, truncate=True)
+    values = chooser.choose_many(100000)
+    assert values.min() >= -0.5 and values.max() <= 2
+    assert all(-0.5 <= chooser.choose() <= 2 for _ in range(1000))
+
+
+@pytest.mark.parametrize('minimum, maximum', [(10, None), (None, -10), (5, 6)])
+def test_truncation_to_an_unlikely_range_is_refused(minimum, maximum):
+    with pytest.raises(ValueError):
+        GaussianChooser(0, 1, minimum=minimum, maximum=maximum, truncate=True)
+    # Clamping is always possible
+    GaussianChooser(0, 1, minimum=minimum, maximum=maximum)
+
+
+def test_redraws_are_bounded(monkeypatch):
+    chooser = GaussianChooser(0, 1, minimum=0, truncate=True)
+    monkeypatch.setattr(GaussianChooser, 'MAX_REDRAWS', 0)
+    with pytest.raises(ValueError):
+        chooser.choose_many(100)
+
+
+def test_gaussian_has_no_choices():
+    with pytest.raises(TypeError):
+        GaussianChooser(0, 1).choices()
+
+
+def test_truncation_to_a_narrow_range():
+    random.seed(1)
+    chooser = GaussianChooser(0, 1, minimum=3, maximum=3.5, truncate=True)
+    values = chooser.choose_many(50000)
+    assert len(values) == 50000 and values.min() >= 3 and values.max() <= 3.5
+
+
+def linear_choice(weighted_choices, rng):
+    # What the alias method replaces: a search of the running totals of the weights
+    choices, weights = zip(*weighted_choices)
+    totals = list(itertools.accumulate(weights))
+    return choices[bisect.bisect(totals, rng.random() * totals[-1])]
+
+
+def assert_close(counts, expected, n):
+    for choice, probability in expected.items():
+        # Within 5 standard deviations of the expected count
+        assert abs(counts[choice] - probability * n) <= 5 * (probability * (1 - probability) * n) ** 0.5 + 1
+
+
+@pytest.mark.parametrize('weights', [WEIGHTS, [('x', 1)], [(i, i % 7) for i in range(50)]])
+def test_alias_and_linear_choices_have_the_same_distribution(weights):
+    n = 100000
+    total = float(sum(w for _, w in weights))
+    expected = dict((choice, w / total) for choice, w in weights)
+    random.seed(0)
+    chooser = WeightedChooser(weights)
+    linear = random.Random(0)
+    assert_close(Counter(chooser.choose() for _ in range(n)), expected, n)
+    assert_close(Counter(chooser.choose_many(n).tolist()), expected, n)
+    assert_close(Counter(linear_choice(weights, linear) for _ in range(n)), expected, n)
+
+
+def test_zero_weight_is_never_chosen():
+    random.seed(0)
+    chooser = WeightedChooser(WEIGHTS)
+    assert 'b' not in set(chooser.choose() for _ in range(10000))
+    assert 'b' not in set(chooser.choose_many(10000).tolist())
+
+
+@pytest.mark.parametrize('weights', [[('a', 1), ('b', -1)], [('a', 2), ('b', -1)], [('a', 1), ('b', float('nan'))],
+                                     [('a', 0)]])
+def test_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        WeightedChooser(weights)
+
+
+@pytest.mark.parametrize('choices', [[1, 'a', 2.5, None], [(1, 2), (3, 4)], [10, 20, 30]])
+def test_many_choices_are_the_choices_themselves(choices):
+    random.seed(0)
+    for chooser in (Chooser(choices), WeightedChooser([(choice, 1) for choice in choices])):
+        values = chooser.choose_many(1000).tolist()
+        assert set(map(repr, values)) == set(map(repr, choices))
+        assert all(type(value) in set(map(type, choices)) for value in values)
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from dtools_lib import delimited_record
+from dtools_lib.delimited_record import Header, Record
+
+TEXT = 'name|city|0\nAda|London|x\nGrace|New York|y\n'
+
+
+def test_records_are_indexed_by_name_and_by_position():
+    header = Header(['name', 'city', '0'])
+    rec = Record(header, ['Ada', 'London', 'x'])
+    assert len(header) == len(rec) == 3
+    assert rec['name'] == rec[0] == rec[-3] == 'Ada'
+    assert rec['city'] == rec[1] == rec[-2] == 'London'
+    # A field named like a number is found by name, its position by the integer
+    assert rec['0'] == rec[2] == 'x'
+    rec['city'] = 'Paris'
+    rec[0] = 'Ida'
+    assert rec.values() == ['Ida', 'Paris', 'x']
+    assert list(rec) == rec.keys() == ['name', 'city', '0']
+    assert list(rec.items()) == [('name', 'Ida'), ('city', 'Paris'), ('0', 'x')]
+    assert 'city' in rec and 1 in rec and 'state' not in rec and 3 not in rec
+    assert rec.get('city') == 'Paris' and rec.get(-1) == 'x'
+    assert rec.get('state') is None and rec.get('state', '') == ''
+    for key in ('state', 3, -4):
+        with pytest.raises(KeyError):
+            rec[key]
+
+
+def test_records_of_a_stream_share_its_header():
+    records = list(delimited_record.read_records(io.StringIO(TEXT)))
+    assert [rec['city'] for rec in records] == ['London', 'New York']
+    assert records[0].header is records[1].header
+    assert [dict(rec.items()) for rec in records] == [{'name': 'Ada', 'city': 'London', '0': 'x'},
+                                                      {'name': 'Grace', 'city': 'New York', '0': 'y'}]
+
+
+def test_fields_are_cut_by_name():
+    assert list(delimited_record.cut_fields(io.StringIO(TEXT), ['0', 'name'])) == [['x', 'Ada'], ['y', 'Grace']]
+
+
+def test_rows_with_the_wrong_number_of_fields_are_rejected():
+    rows = delimited_record.read_rows(io.StringIO(TEXT + 'Alan|Wilmslow\n'))
+    assert next(rows) == ['Ada', 'London', 'x']
+    assert next(rows) == ['Grace', 'New York', 'y']
+    with pytest.raises(ValueError):
+        next(rows)
+
+
+def test_column_batches():
+    batches = list(delimited_record.read_column_batches(io.StringIO(TEXT), batch_size=1))
+    assert batches == [[['Ada'], ['London'], ['x']], [['Grace'], ['New York'], ['y']]]
@@ -0,0 +1,206 @@
+import random
+import string
+
+import pytest
+
+from dtools_lib import delimited_record
+from dtools_lib import expression
+from dtools_lib import transforms
+
+HEADER = ['name', 'city', 'lat', 'lon', 'n']
+CITIES = ['Boston', 'boston', 'Springfield', 'Salem', 'New Bedford']
+
+ASSIGNMENTS = [
+    "upper = ToUpper($name)",
+    "full = Concat(ToUpper($city), '-', ToLower($city)); same = Equals(ToUpper($city), ToUpper($city))",
+    "km = Haversine(Float($lon), Float($lat), -71.06, 42.36); miles = KilometersToMiles($km)",
+    "total = Sum(Integer($n), Integer($n), 3); big = GreaterThan(Integer($n), 50)",
+    # Past the range of int64, where record mode gives Python's arbitrary precision integers
+    "p = Product(Sum(Integer($n), 4000000000), Sum(Integer($n), 4000000000)); d = Subtract(Integer($n), Product($p, 4))",
+    # The second Reverse($name) reads the name the first assignment changed
+    "before = Reverse($name); name = Reverse($name); after = Reverse($name)",
+    "pattern = Pattern($name); length = Length(Strip($name)); padded = RJust($city, 14, '.')",
+    "count = RecordCount(); constant = Concat(ToUpper('abc'), Length('abcd'))",
+    "city = Lookup($city, CreateMap('%s', 'name', 'state'), 'unknown')",
+]
+
+COMPARISONS = [
+    "$city == 'Boston'",
+    "All(GreaterThan(Integer($n), 50), LessThan(Length($name), 8)) == True",
+    "Equals(ToUpper($city), ToUpper('boston')) || Equals($n, '3')",
+    "Float($lat) >= 42.3",
+    "Pattern($name) != 'L+'",
+]
+
+
+@pytest.fixture(autouse=True)
+def record_state():
+    record, record_count = transforms.RECORD, transforms.RECORD_COUNT
+    yield
+    transforms.RECORD, transforms.RECORD_COUNT = record, record_count
+
+
+@pytest.fixture
+def states(tmp_path, monkeypatch):
+    monkeypatch.setenv('DTOOLS_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'states.csv'
+    path.write_text('name|state\nBoston|MA\nSalem|MA\nSpringfield|IL\n')
+    return str(path)
+
+
+def random_rows(seed, count=200):
+    rng = random.Random(seed)
+    letters = string.ascii_letters + ' -.'
+    return [[''.join(rng.choice(letters) for _ in range(rng.randrange(1, 12))), rng.choice(CITIES),
+             '{0:.4f}'.format(rng.uniform(41, 43)), '{0:.4f}'.format(rng.uniform(-73, -70)), str(rng.randrange(100))]
+            for _ in range(count)]
+
+
+def interpret(atom):
+    """Evaluate an AST the way the expression engine did before it was compiled: every call, every time"""
+    if isinstance(atom, expression.FunctionCall):
+        return atom.fn(*[interpret(arg) for arg in atom.args])
+    return atom
+
+
+def derive_interpreted(text, rows):
+    assignments = list(expression.ASSIGNMENTS.parseString(text, parseAll=True))
+    header = delimited_record.Header(expression.Expression([], {}, [a.lhs for a in assignments]).output_header(HEADER))
+    result = []
+    for i, row in enumerate(rows):
+        transforms.RECORD = delimited_record.Record(header, row + [''] * (len(header) - len(row)))
+        transforms.RECORD_COUNT = i + 1
+        for assignment in assignments:
+            transforms.RECORD[assignment.lhs] = interpret(assignment.rhs)
+        result.append([str(value) for value in transforms.RECORD.values()])
+    return result
+
+
+def derive_records(text, rows, **kwargs):
+    expr = expression.compile_assignments(text, **kwargs)
+    header = delimited_record.Header(expr.output_header(HEADER))
+    result = []
+    for i, row in enumerate(rows):
+        transforms.RECORD = delimited_record.Record(header, row + [''] * (len(header) - len(row)))
+        transforms.RECORD_COUNT = i + 1
+        expr()
+        result.append([str(value) for value in transforms.RECORD.values()])
+    return result
+
+
+def filter_interpreted(text, rows):
+    comparison = expression.COMPARISON.parseString(text, parseAll=True)[0]
+    header = delimited_record.Header(HEADER)
+    result = []
+    for i, row in enumerate(rows):
+        transforms.RECORD = delimited_record.Record(header, row)
+        transforms.RECORD_COUNT = i + 1
+        if interpret(comparison):
+            result.append(row)
+    return result
+
+
+def filter_records(text, rows, **kwargs):
+    expr = expression.compile_comparison(text, **kwargs)
+    header = delimited_record.Header(HEADER)
+    result = []
+    for i, row in enumerate(rows):
+        transforms.RECORD = delimited_record.Record(header, row)
+        transforms.RECORD_COUNT = i + 1
+        if expr():
+            result.append(row)
+    return result
+
+
+OPTIMIZATIONS = [{}, {'fold_constants': False}, {'share_subexpressions': False},
+                 {'fold_constants': False, 'share_subexpressions': False}]
+
+
+@pytest.mark.parametrize('options', OPTIMIZATIONS)
+@pytest.mark.parametrize('text', ASSIGNMENTS)
+def test_compiled_assignments_match_the_interpreter(text, options, states):
+    text = text.replace('%s', states)
+    rows = random_rows(1)
+    assert derive_records(text, rows, **options) == derive_interpreted(text, rows)
+
+
+@pytest.mark.parametrize('options', OPTIMIZATIONS)
+@pytest.mark.parametrize('text', COMPARISONS)
+def test_compiled_comparisons_match_the_interpreter(text, options):
+    rows = random_rows(2)
+    selected = filter_records(text, rows, **options)
+    assert selected == filter_interpreted(text, rows)
+    assert 0 < len(selected) < len(rows)
+
+
+def test_shared_subexpressions_are_evaluated_once(monkeypatch):
+    calls = []
+
+    def ToUpper(s):
+        calls.append(s)
+        return s.upper()
+    monkeypatch.setattr(transforms, 'ToUpper', ToUpper)
+    rows = random_rows(3, 10)
+    derive_records("a = ToUpper($city); b = Concat(ToUpper($city), ToUpper($city))", rows)
+    assert len(calls) == len(rows)
+
+
+def batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield start, [list(column) for column in zip(*rows[start:start + size])]
+
+
+def derive_batches(text, rows, size, **kwargs):
+    expr = expression.compile_assignments(text, batch=True, **kwargs)
+    header = expr.output_header(HEADER)
+    result = []
+    for record_count, columns in batches(rows, size):
+        batch = expression.Batch(HEADER, columns, record_count)
+        expr(batch)
+        # Fields are in the order of the output header, as dt_derive writes them
+        result.extend([str(value) for value in row] for row in batch.rows())
+        assert list(batch.columns) == header
+    return result
+
+
+def filter_batches(text, rows, size, **kwargs):
+    expr = expression.compile_comparison(text, batch=True, **kwargs)
+    result = []
+    for record_count, columns in batches(rows, size):
+        batch = expression.Batch(HEADER, columns, record_count)
+        result.extend(list(row) for row in batch.rows(mask=expr(batch)))
+    return result
+
+
+def assert_same_rows(rows, expected):
+    # NumPy's trigonometric functions can differ from math's in the last bit
+    assert len(rows) == len(expected)
+    for row, expected_row in zip(rows, expected):
+        assert len(row) == len(expected_row)
+        for value, expected_value in zip(row, expected_row):
+            if value != expected_value:
+                assert float(value) == pytest.approx(float(expected_value), rel=1e-12), (row, expected_row)
+
+
+@pytest.mark.parametrize('size', [1, 7, 1000])
+@pytest.mark.parametrize('text', ASSIGNMENTS)
+def test_batch_assignments_match_record_mode(text, size, states):
+    text = text.replace('%s', states)
+    rows = random_rows(4)
+    assert_same_rows(derive_batches(text, rows, size), derive_records(text, rows))
+
+
+@pytest.mark.parametrize('size', [1, 7, 1000])
+@pytest.mark.parametrize('text', COMPARISONS)
+def test_batch_comparisons_match_record_mode(text, size):
+    rows = random_rows(5)
+    assert filter_batches(text, rows, size) == filter_records(text, rows)
+
+
+@pytest.mark.parametrize('text', ["bad = Haversine($lon, $lat, -71.06, 42.36)", "bad = Sum($n, 1)"])
+def test_batch_mode_raises_as_record_mode_does(text):
+    rows = random_rows(6, 10)
+    with pytest.raises(TypeError):
+        derive_records(text, rows)
+    with pytest.raises(TypeError):
+        derive_batches(text, rows, 5)
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DT_GENERATE = os.path.join(ROOT, 'bin', 'dt_generate')
+
+CONFIG = """[Record]
+header: sequence|name|gender|height|birth_date|residential_postal_code|departure_airport|arrival_airport
+template: $sequence|$name|$gender|$height|$birth_date|$residential_postal_code|$departure_airport|$arrival_airport
+
+[Generator]
+records: 50
+seed: {seed}
+postal_codes: {data}/us_postal_codes.csv
+airport_codes: {data}/large_airports.csv
+locale: en_US
+"""
+
+
+@pytest.fixture
+def config(tmp_path):
+    def write(seed=7):
+        path = tmp_path / 'generate_{0:d}.ini'.format(seed)
+        path.write_text(CONFIG.format(seed=seed, data=os.path.join(ROOT, 'data')))
+        return str(path)
+    return write
+
+
+def dt_generate(tmp_path, *arguments):
+    result = subprocess.run([sys.executable, DT_GENERATE] + list(arguments), capture_output=True, text=True,
+                            check=True, env=dict(os.environ, DTOOLS_CACHE_DIR=str(tmp_path / 'cache')))
+    return result.stdout
+
+
+@pytest.mark.parametrize('workers', [0, 1, 3])
+def test_the_same_seed_and_workers_give_the_same_records(tmp_path, config, workers):
+    options = ['--workers', str(workers), config()]
+    records = dt_generate(tmp_path, *options)
+    lines = records.splitlines()
+    assert len(lines) == 51 and lines[0].startswith('sequence|name|')
+    # Sequence numbers run on across the shards
+    assert [line.split('|')[0] for line in lines[1:]] == [str(i) for i in range(1, 51)]
+    assert dt_generate(tmp_path, *options) == records
+    assert dt_generate(tmp_path, '--workers', str(workers), config(seed=8)) != records
+
+
+def test_parts_are_the_shards_of_the_output(tmp_path, config):
+    prefix = str(tmp_path / 'part')
+    records = dt_generate(tmp_path, '--workers', '3', config())
+    assert dt_generate(tmp_path, '--workers', '3', '--parts', prefix, config()) == ''
+    parts = [(tmp_path / 'part-{0:05d}'.format(shard)).read_text().splitlines() for shard in range(3)]
+    header = records.splitlines()[0]
+    assert all(part[0] == header for part in parts)
+    assert [header] + [line for part in parts for line in part[1:]] == records.splitlines()
+
+
+def test_parts_require_workers(tmp_path, config):
+    with pytest.raises(subprocess.CalledProcessError):
+        dt_generate(tmp_path, '--parts', str(tmp_path / 'part'), config())
+    assert not any(name.startswith('part') for name in os.listdir(str(tmp_path)))
@@ -0,0 +1,93 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+DT_JOIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'dt_join')
+
+
+def numeric_order(key):
+    return [float(value) for value in key]
+
+
+def make_inputs(tmp_path, seed, numeric=False):
+    rng = random.Random(seed)
+    if numeric:
+        keys = [(str(rng.randrange(120)), rng.choice(['0.5', '2', '10'])) for _ in range(300)]
+        extra = [('999', '2'), ('999', '2')]
+        order = numeric_order
+    else:
+        keys = [('k{0:d}'.format(rng.randrange(40)), rng.choice('xyz')) for _ in range(300)]
+        extra = [('k99', 'x'), ('k99', 'x')]
+        order = None
+    # Both sorted on the join fields in stream header order, as --sorted requires
+    stream = sorted(keys, key=order)
+    reference = sorted(rng.sample(keys, 60) + extra, key=order)
+    stream_text = 'id~a~b\n' + ''.join('{0:d}~{1}~{2}\n'.format(i, a, b) for i, (a, b) in enumerate(stream))
+    # A record with the wrong number of fields is skipped
+    stream_text += 'bad~record\n'
+    reference_text = 'val~ka~kb~extra\n' + ''.join('v{0:d}~{1}~{2}~e{0:d}\n'.format(i, a, b)
+                                                   for i, (a, b) in enumerate(reference))
+    path = tmp_path / 'reference.txt'
+    path.write_text(reference_text)
+    return stream_text, str(path), stream, reference
+
+
+def dt_join(stream_text, reference, *options):
+    result = subprocess.run([sys.executable, DT_JOIN] + list(options) + [reference, 'ka:a,kb:b'],
+                            input=stream_text, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def expected_join(stream, reference, all_matches, left_outer):
+    lookup = {}
+    for i, key in enumerate(reference):
+        value = ['v{0:d}'.format(i), 'e{0:d}'.format(i)]
+        if all_matches:
+            lookup.setdefault(key, []).append(value)
+        else:
+            lookup[key] = [value]
+    lines = ['id~a~b~val~extra']
+    for i, key in enumerate(stream):
+        for value in lookup.get(key, [['', '']] if left_outer else []):
+            lines.append('~'.join([str(i), key[0], key[1]] + value))
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.mark.parametrize('all_matches', [False, True])
+@pytest.mark.parametrize('left_outer', [False, True])
+def test_hash_spilled_and_merge_joins_agree(tmp_path, all_matches, left_outer):
+    stream_text, reference_path, stream, reference = make_inputs(tmp_path, 0)
+    options = (['--all-matches'] if all_matches else []) + (['--left-outer'] if left_outer else [])
+    expected = expected_join(stream, reference, all_matches, left_outer)
+    assert dt_join(stream_text, reference_path, *options) == expected
+    spilled = options + ['--max-memory', '0', '--partitions', '3', '--tmpdir', str(tmp_path)]
+    assert dt_join(stream_text, reference_path, *spilled) == expected
+    assert dt_join(stream_text, reference_path, '--sorted', *options) == expected
+    # The temporary files are removed
+    assert sorted(os.listdir(str(tmp_path))) == ['reference.txt']
+
+
+def test_partitions_too_large_are_partitioned_again(tmp_path):
+    stream_text, reference_path, stream, reference = make_inputs(tmp_path, 1)
+    expected = expected_join(stream, reference, True, True)
+    result = subprocess.run([sys.executable, DT_JOIN, '--all-matches', '--left-outer', '--max-memory', '0',
+                             '--partitions', '5', '--tmpdir', str(tmp_path), reference_path, 'ka:a,kb:b'],
+                            input=stream_text, capture_output=True, text=True, check=True)
+    assert result.stdout == expected
+    assert 'of level 2 again' in result.stderr
+    assert sorted(os.listdir(str(tmp_path))) == ['reference.txt']
+
+
+@pytest.mark.parametrize('all_matches', [False, True])
+def test_merge_join_of_inputs_sorted_as_numbers(tmp_path, all_matches):
+    stream_text, reference_path, stream, reference = make_inputs(tmp_path, 2, numeric=True)
+    options = ['--left-outer'] + (['--all-matches'] if all_matches else [])
+    expected = expected_join(stream, reference, all_matches, True)
+    assert dt_join(stream_text, reference_path, *options) == expected
+    assert dt_join(stream_text, reference_path, '--sorted', '--numeric', *options) == expected
+    # Sorted as numbers, "10" comes after "9" and the inputs are not sorted as text
+    with pytest.raises(subprocess.CalledProcessError):
+        dt_join(stream_text, reference_path, '--sorted', *options)
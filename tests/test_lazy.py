@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from dtools_lib.lazy import CircularReferenceError, ConstantRedefinitionError, LazyDictionary, arity
+
+
+class Provider(object):
+
+    def no_arguments(self):
+        return 'called'
+
+    def dictionary(self, d):
+        return d['a']
+
+
+def test_callables_are_called_once_with_the_dictionary_when_they_take_one_argument():
+    calls = []
+
+    def expensive():
+        calls.append(1)
+        return 42
+    d = LazyDictionary({'a': expensive, 'b': lambda d: d['a'] + 1, 'c': 3, 'd': lambda x, y: x})
+    assert d['b'] == 43
+    assert d['a'] == 42
+    assert len(calls) == 1
+    assert d['c'] == 3
+    # Callables taking more arguments are values
+    assert callable(d['d'])
+    assert len(d) == 4 and sorted(d) == ['a', 'b', 'c', 'd']
+
+
+def test_values_are_frozen_once_read():
+    d = LazyDictionary({'a': 1, 'b': lambda: 2})
+    d['a'] = 10
+    del d['b']
+    d['b'] = lambda: 20
+    assert d['a'] == 10 and d['b'] == 20
+    with pytest.raises(ConstantRedefinitionError):
+        d['a'] = 11
+    with pytest.raises(ConstantRedefinitionError):
+        del d['b']
+    assert d['a'] == 10 and d['b'] == 20
+
+
+def test_errors_are_raised_on_every_read():
+    calls = []
+
+    def fails():
+        calls.append(1)
+        raise KeyError('missing')
+    d = LazyDictionary({'a': fails, 'b': lambda d: d['a']})
+    for key in ('a', 'a', 'b'):
+        with pytest.raises(KeyError):
+            d[key]
+    # The error is kept, the callable is not called again
+    assert len(calls) == 1
+    # A key whose value raised has not been frozen
+    d['a'] = 1
+    assert d['a'] == 1
+
+
+def test_values_referring_to_each_other():
+    d = LazyDictionary({
+        'full': lambda d: d['first'] + ' ' + d['last'],
+        'first': 'Ada',
+        'last': lambda d: d['first'][0] + 'da',
+        'loop': lambda d: d['other'],
+        'other': lambda d: d['loop'],
+        'self': lambda d: d['self'],
+    })
+    assert d['full'] == 'Ada Ada'
+    with pytest.raises(CircularReferenceError):
+        d['loop']
+    with pytest.raises(CircularReferenceError):
+        d['self']
+
+
+def test_materialize_evaluates_only_the_keys_asked_for():
+    calls = []
+
+    def value(key):
+        return lambda: calls.append(key) or key.upper()
+    d = LazyDictionary(dict((key, value(key)) for key in 'abcd'))
+    assert d.materialize(['b', 'd', 'missing']) == {'b': 'B', 'd': 'D'}
+    assert sorted(calls) == ['b', 'd']
+    assert d.materialize() == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}
+    assert sorted(calls) == ['a', 'b', 'c', 'd']
+
+
+def test_bound_methods_are_counted_with_self():
+    provider = Provider()
+    assert arity(provider.no_arguments) == 1
+    assert arity(provider.dictionary) == 2
+    assert arity(Provider) == 0
+    assert arity(len) == 1
+    d = LazyDictionary({'a': 'x', 'method': provider.dictionary, 'wrapped': lambda: provider.no_arguments()})
+    assert d['method'] == provider.dictionary
+    assert d['wrapped'] == 'called'
+
+
+def test_locked_dictionary_evaluates_each_value_once_across_threads():
+    calls = []
+    started = threading.Barrier(8)
+
+    def slow():
+        calls.append(1)
+        return sum(range(100000))
+    d = LazyDictionary({'a': slow, 'b': lambda d: d['a'] * 2}, lock=True)
+    results = []
+
+    def read():
+        started.wait()
+        results.append((d['b'], d['a']))
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [(2 * sum(range(100000)), sum(range(100000)))] * 8
+    assert d.materialize(['a']) == {'a': sum(range(100000))}
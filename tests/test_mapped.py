@@ -0,0 +1,39 @@
+import pytest
+
+from dtools_lib import mapped
+
+LINES = ['a~b~c', '1~2~3', '', '4~5', '6~7~8~9', 'é~ü~ß', '10~11~12  ', '~~']
+
+
+@pytest.mark.parametrize('ending', ['\n', ''])
+@pytest.mark.parametrize('window_size', [1, 7, mapped.DEFAULT_WINDOW_SIZE])
+def test_mapped_file_reads_like_a_text_file(tmp_path, ending, window_size):
+    path = tmp_path / 'records.txt'
+    path.write_text('\n'.join(LINES) + ending, encoding='utf-8')
+    with open(str(path), encoding='utf-8') as f:
+        mapped_file = mapped.MappedFile(f, window_size=window_size)
+        assert mapped_file.readline() == LINES[0] + '\n'
+        assert list(mapped_file) == LINES[1:]
+
+
+@pytest.mark.parametrize('sep', ['~', ' ', '~~'])
+@pytest.mark.parametrize('window_size', [1, 7, mapped.DEFAULT_WINDOW_SIZE])
+def test_field_counts_match_split(tmp_path, sep, window_size):
+    path = tmp_path / 'records.txt'
+    path.write_text('\n'.join(LINES) + '\n', encoding='utf-8')
+    with open(str(path), encoding='utf-8') as f:
+        mapped_file = mapped.MappedFile(f, window_size=window_size)
+        counts = []
+        for starts, ends, window_counts in mapped_file.field_counts(sep):
+            for start, end, count in zip(starts, ends, window_counts):
+                assert mapped_file.decode(start, end) == LINES[len(counts)]
+                counts.append(int(count))
+    assert counts == [len(line.rstrip().split(sep)) for line in LINES]
+
+
+def test_streams_are_not_mapped(tmp_path):
+    empty = tmp_path / 'empty.txt'
+    empty.write_text('')
+    with open(str(empty)) as f:
+        assert mapped.map_file(f) is None
+    assert mapped.map_file(object()) is None
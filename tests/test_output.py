@@ -0,0 +1,55 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dtools_lib import output
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BrokenStream(io.StringIO):
+
+    def write(self, text):
+        raise BrokenPipeError()
+
+
+def test_output_is_written_in_blocks():
+    stream = io.StringIO()
+    with output.OutputSink(stream, flush_size=10) as sink:
+        sink.write_record(['a', 'b'], '~')
+        assert stream.getvalue() == ''
+        sink.writelines(['cdef', 'gh\n'])
+        assert stream.getvalue() == 'a~b\ncdefgh\n'
+        sink.write_line('last')
+        assert stream.getvalue() == 'a~b\ncdefgh\n'
+    assert stream.getvalue() == 'a~b\ncdefgh\nlast\n'
+
+
+def test_text_is_encoded_for_the_binary_layer():
+    binary = io.BytesIO()
+    stream = io.TextIOWrapper(binary, encoding='latin-1')
+    stream.write('before ')
+    with output.OutputSink(stream) as sink:
+        sink.write('caf\xe9\n')
+    assert binary.getvalue() == b'before caf\xe9\n'
+
+
+def test_broken_pipe_on_other_streams_is_raised():
+    sink = output.OutputSink(BrokenStream())
+    sink.write('text')
+    with pytest.raises(BrokenPipeError):
+        sink.close()
+
+
+def test_broken_pipe_on_stdout_exits_quietly():
+    script = 'from dtools_lib import output\nwith output.OutputSink(flush_size=100) as sink:\n' \
+             '    for i in range(1000000):\n        sink.write_line(str(i))\n'
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=ROOT, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    assert process.stdout.readline() == b'0\n'
+    process.stdout.close()
+    assert process.wait() == 1
+    assert process.stderr.read() == b''
@@ -0,0 +1,83 @@
+import io
+import random
+
+import pytest
+
+from dtools_lib import parallel
+from dtools_lib import transforms
+
+LINES = ['{0:d}~{1}\n'.format(i, 'x' * (i % 13)) for i in range(500)]
+
+
+def numbered(lines, first_record):
+    # The number each record has in the whole input, and the record itself
+    for i, line in enumerate(lines, first_record + 1):
+        yield '{0:d}:{1}\n'.format(i, line.rstrip('\n'))
+
+
+def draws(lines, first_record):
+    for line in lines:
+        yield '{0}:{1:d}\n'.format(line.rstrip('\n'), random.randrange(1 << 30))
+
+
+def run(processor, workers, chunk_size=200, ordered=True, seed=None, text=''.join(LINES)):
+    chunks = []
+    parallel.run(processor, io.StringIO(text), lambda items: chunks.append(list(items)), workers=workers,
+                 chunk_size=chunk_size, ordered=ordered, seed=seed)
+    return chunks
+
+
+def test_chunks_split_on_newlines_and_count_the_preceding_records():
+    text = ''.join(LINES) + 'last'
+    chunks = list(parallel.read_chunks(io.StringIO(text), 100))
+    assert len(chunks) > 10
+    assert ''.join(chunk for _, _, chunk in chunks) == text
+    assert [number for number, _, _ in chunks] == list(range(len(chunks)))
+    first_record = 0
+    for _, first, chunk in chunks:
+        assert first == first_record
+        assert chunk.endswith('\n') or chunk.endswith('last')
+        first_record += len(chunk.splitlines())
+
+
+@pytest.mark.parametrize('workers', [0, 1, 3])
+def test_record_numbers_continue_across_chunks(workers):
+    expected = ['{0:d}:{1}'.format(i + 1, line) for i, line in enumerate(LINES)]
+    chunks = run(numbered, workers)
+    assert len(chunks) == 1 if workers == 0 else len(chunks) > 10
+    assert [item for chunk in chunks for item in chunk] == expected
+
+
+def test_record_count_continues_across_chunks(monkeypatch):
+    monkeypatch.setattr(transforms, 'RECORD_COUNT', 0)
+
+    # A processor that keeps the record count in module state, as the tools do with transforms.RECORD_COUNT
+    def processor(lines, first_record):
+        transforms.RECORD_COUNT = first_record
+        for line in lines:
+            transforms.RECORD_COUNT += 1
+            yield '{0:d}\n'.format(transforms.RECORD_COUNT)
+    chunks = run(processor, 3)
+    assert [item for chunk in chunks for item in chunk] == ['{0:d}\n'.format(i + 1) for i in range(len(LINES))]
+
+
+def test_unordered_chunks_hold_the_same_output():
+    ordered = run(numbered, 3)
+    unordered = run(numbered, 3, ordered=False)
+    assert len(unordered) == len(ordered)
+    # Each chunk is consumed whole, only the order of the chunks may differ
+    assert sorted(unordered) == sorted(ordered)
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_seeded_chunks_are_reproducible_for_any_number_of_workers(workers):
+    expected = run(draws, 1, seed=7)
+    assert run(draws, workers, seed=7) == expected
+    assert run(draws, workers, seed=7) == expected
+    assert run(draws, workers, seed=8) != expected
+
+
+def test_unseeded_workers_draw_different_values():
+    random.seed(0)
+    values = [item.split(':')[1] for chunk in run(draws, 2, seed=None) for item in chunk]
+    assert len(set(values)) == len(values)
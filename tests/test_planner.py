@@ -0,0 +1,75 @@
+import pytest
+
+from dtools_lib.lazy import LazyDictionary
+from dtools_lib.planner import Plan, Step
+
+
+class Provider(object):
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def generate(self):
+        self.log.append(self.name)
+        return LazyDictionary({self.name: lambda: self.name.upper()})
+
+
+def steps(log, created):
+    def create(name):
+        def factory():
+            created.append(name)
+            return Provider(name, log)
+        return factory
+
+    def greeting(provider, values, keys):
+        log.append('greeting')
+        return {'greeting': values['name'] + ' from ' + values['city']}
+    return [
+        Step('greeting', ['greeting'], create('greeting'), greeting, requires={'greeting': ['name', 'city']}),
+        Step('city', ['city'], create('city')),
+        Step('unused', ['unused'], create('unused')),
+        Step('name', ['name'], create('name')),
+    ]
+
+
+def test_steps_are_evaluated_after_their_dependencies():
+    log, created = [], []
+    plan = Plan(steps(log, created), ['greeting', 'missing'])
+    assert plan.names() == ['city', 'name', 'greeting']
+    # Steps no variable depends on are never created
+    assert sorted(created) == ['city', 'greeting', 'name']
+    assert plan.generate() == {'city': 'CITY', 'name': 'NAME', 'greeting': 'NAME from CITY'}
+    assert log == ['city', 'name', 'greeting']
+
+
+def test_steps_keep_their_order_when_independent():
+    plan = Plan(steps([], []), ['name', 'unused', 'city'])
+    assert plan.names() == ['city', 'unused', 'name']
+
+
+def test_circular_dependencies_are_rejected():
+    def create():
+        return None
+    cycle = [Step('a', ['a'], create, requires={'a': ['b']}), Step('b', ['b'], create, requires={'b': ['c']}),
+             Step('c', ['c'], create, requires={'c': ['a']}), Step('d', ['d'], create)]
+    with pytest.raises(ValueError, match='Circular dependency between the providers a, b, c'):
+        Plan(cycle, ['d', 'a'])
+    # Only the steps that are needed count
+    assert Plan(cycle, ['d']).names() == ['d']
+
+
+def test_keys_of_a_reference_file_are_only_looked_up_when_needed():
+    lookups = []
+
+    def keys():
+        lookups.append(1)
+        return ['ref_code', 'ref_name']
+    reference = Step('reference', keys, lambda: Provider('ref_name', []), prefix='ref_')
+    plain = Step('name', ['name'], lambda: Provider('name', []))
+    assert Plan([reference, plain], ['name', 'other']).names() == ['name']
+    assert lookups == []
+    plan = Plan([reference, plain], ['ref_name', 'name'])
+    assert plan.names() == ['reference', 'name']
+    assert plan.generate() == {'ref_name': 'REF_NAME', 'name': 'NAME'}
+    assert lookups == [1]
@@ -0,0 +1,86 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+from dtools_lib import reference_cache
+
+
+class Renamed(object):
+    pass
+
+
+@pytest.fixture
+def reference_file(tmp_path, monkeypatch):
+    cache = tmp_path / 'cache'
+    cache.mkdir(mode=0o700)
+    monkeypatch.setenv('DTOOLS_CACHE_DIR', str(cache))
+    path = tmp_path / 'reference.csv'
+    path.write_text('key|value\na|1\nb|2\n')
+    return str(path)
+
+
+def counting_build(calls, result):
+    def build():
+        calls.append(1)
+        return result
+    return build
+
+
+def entry_path(filename):
+    return reference_cache.cache_path(reference_cache.cache_dir(), 'test', filename, ('key',), '|')
+
+
+def test_round_trip(reference_file):
+    calls = []
+    first = reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, {'a': ['1']}))
+    second = reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, None))
+    assert first == second == {'a': ['1']}
+    assert len(calls) == 1
+
+
+def test_changed_file_is_rebuilt(reference_file):
+    calls = []
+    reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, 1))
+    with open(reference_file, 'a') as f:
+        f.write('c|3\n')
+    assert reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, 2)) == 2
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'not a pickle',
+    pickle.dumps(1)[:-1],
+    'renamed',
+])
+def test_unloadable_entry_is_rebuilt(reference_file, content, monkeypatch):
+    if content == 'renamed':
+        # A pickle of a class that no longer exists, as left behind by a rename
+        content = pickle.dumps(Renamed())
+        monkeypatch.delattr(sys.modules[__name__], 'Renamed')
+    path = entry_path(reference_file)
+    with open(path, 'wb') as f:
+        f.write(content)
+    assert reference_cache.load('test', reference_file, ('key',), '|', lambda: 'rebuilt') == 'rebuilt'
+    with open(path, 'rb') as f:
+        assert pickle.load(f) == 'rebuilt'
+
+
+def test_empty_cache_dir_disables_the_cache(reference_file, monkeypatch):
+    monkeypatch.setenv('DTOOLS_CACHE_DIR', '')
+    calls = []
+    for _ in range(2):
+        reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, 1))
+    assert len(calls) == 2
+
+
+def test_directory_writable_by_others_is_not_used(reference_file):
+    directory = reference_cache.cache_dir()
+    os.chmod(directory, 0o777)
+    calls = []
+    for _ in range(2):
+        reference_cache.load('test', reference_file, ('key',), '|', counting_build(calls, 1))
+    assert len(calls) == 2
+    assert os.listdir(directory) == []
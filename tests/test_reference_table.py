@@ -0,0 +1,114 @@
+import io
+import pickle
+import random
+from collections import Counter
+
+import numpy
+import pytest
+
+from dtools_lib import reference_table
+from dtools_lib.reference_table import ReferenceTable, subtract_ranges
+
+AIRPORTS = 'iata_code|country_code|iso_region\nA|X|X-1\nB|Y|Y-1\nC|X|X-2\nD|Z|Z-1\nE|Y|Y-1\nF|X|X-1\n'
+
+
+def airports():
+    return ReferenceTable(io.StringIO(AIRPORTS), key='country_code')
+
+
+def rows_of(ranges):
+    return [i for start, end in ranges for i in range(start, end)]
+
+
+def test_groups_are_contiguous_in_file_order():
+    table = airports()
+    assert table.groups() == ['X', 'Y', 'Z']
+    assert table.column('iata_code') == ['A', 'C', 'F', 'B', 'E', 'D']
+    assert [table.group_range(g) for g in range(3)] == [(0, 3), (3, 5), (5, 6)]
+    assert table.rows_where('iso_region', 'X-1') == [(0, 1), (2, 3)]
+    assert table.view(1)['iata_code'] == 'C'
+    assert dict(table.view(5, {'code': 0})) == {'code': 'D'}
+
+
+def test_draw_stays_in_its_groups():
+    table = airports()
+    groups = numpy.array([0, 1, 2] * 1000)
+    rows = table.draw(numpy.random.default_rng(0), groups)
+    assert all(table.column('country_code')[i] == table.groups()[g] for i, g in zip(rows.tolist(), groups.tolist()))
+
+
+def test_subtract_ranges():
+    rng = random.Random(0)
+    for _ in range(2000):
+        n = rng.randrange(30)
+        points = sorted(rng.sample(range(n + 1), min(n + 1, 2 * rng.randrange(4))))
+        ranges = list(zip(points[::2], points[1::2]))
+        excluded = []
+        for _ in range(rng.randrange(4)):
+            start = rng.randrange(n + 1)
+            excluded.append((start, rng.randrange(start, n + 1)))
+        expected = sorted(set(rows_of(ranges)) - set(rows_of(excluded)))
+        assert rows_of(subtract_ranges(ranges, excluded)) == expected
+
+
+def test_choose_is_uniform_over_the_rows_left():
+    table = airports()
+    rng = random.Random(0)
+    counts = Counter(table.get(table.choose(rng.randrange, table.all_rows(), table.group_rows('X')), 'iata_code')
+                     for _ in range(30000))
+    assert set(counts) == {'B', 'E', 'D'}
+    assert all(abs(count - 10000) < 500 for count in counts.values())
+    assert table.choose(rng.randrange, table.group_rows('Z'), table.rows_where('iata_code', 'D')) is None
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    monkeypatch.setenv('DTOOLS_CACHE_DIR', str(directory))
+    return directory
+
+
+def test_snapshot_round_trip(tmp_path, cache_dir):
+    path = tmp_path / 'airports.csv'
+    path.write_text(AIRPORTS)
+    with open(str(path)) as f:
+        built = reference_table.load_table(f, key='country_code')
+    with open(str(path)) as f:
+        loaded = reference_table.load_table(f, key='country_code')
+        # Loaded from the snapshot, without reading the file
+        assert f.tell() == 0
+    assert loaded.columns_ == built.columns_ and loaded.groups() == built.groups()
+    assert loaded.rows_where('iso_region', 'Y-1') == [(3, 5)]
+
+
+def test_snapshot_of_another_layout_is_rebuilt(tmp_path, cache_dir):
+    path = tmp_path / 'airports.csv'
+    path.write_text(AIRPORTS)
+    with open(str(path)) as f:
+        reference_table.load_table(f, key='country_code')
+    snapshot = [str(p) for p in cache_dir.iterdir()][0]
+    with open(snapshot, 'rb') as f:
+        table = pickle.load(f)
+    # As written by a version of ReferenceTable without the column index
+    del table.__dict__['value_rows_']
+    with open(snapshot, 'wb') as f:
+        pickle.dump(table, f)
+    with open(str(path)) as f:
+        loaded = reference_table.load_table(f, key='country_code')
+    assert loaded.rows_where('iso_region', 'X-1') == [(0, 1), (2, 3)]
+
+
+def test_ragged_rows_are_only_accepted_when_asked_for(tmp_path, cache_dir):
+    text = 'name|code|region\nshort|S\nlong|L|L-1|extra\nfull|F|F-1\n'
+    with pytest.raises(ValueError):
+        ReferenceTable(io.StringIO(text))
+    table = ReferenceTable(io.StringIO(text), ragged=True)
+    assert [table.row(i) for i in range(len(table))] == [['short', 'S', ''], ['long', 'L', 'L-1'], ['full', 'F', 'F-1']]
+    path = tmp_path / 'ragged.csv'
+    path.write_text(text)
+    with open(str(path)) as f:
+        assert reference_table.load_table(f, ragged=True).columns_ == table.columns_
+    # The strict table of the same file is not the ragged table's snapshot
+    with open(str(path)) as f:
+        with pytest.raises(ValueError):
+            reference_table.load_table(f)
@@ -0,0 +1,47 @@
+import random
+from collections import Counter
+
+import pytest
+
+from dtools_lib.sketches import HyperLogLog, ValueSketch
+
+
+@pytest.mark.parametrize('n', [0, 1, 100, 5000, 16384, 40000, 80000, 200000])
+def test_cardinality_is_within_the_standard_error(n):
+    # Across the range where the raw estimate is biased (around 2.5 to 5 times the 16384 registers)
+    errors = []
+    for seed in range(3):
+        sketch = HyperLogLog()
+        for i in range(n):
+            sketch.add('{0}-{1}'.format(seed, i))
+        errors.append(sketch.cardinality() - n)
+    assert abs(sum(errors) / 3.0) <= max(1, 3 * 0.0081 * n / 3 ** 0.5)
+
+
+def test_merged_cardinality():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        first.add(str(i))
+        second.add(str(i + 20000))
+    first.merge(second)
+    assert abs(first.cardinality() - 50000) < 0.03 * 50000
+
+
+def test_most_common_of_a_skewed_column():
+    rng = random.Random(0)
+    values = [str(min(int(rng.paretovariate(1.2)), 100000)) for _ in range(200000)]
+    sketch = ValueSketch(capacity=200)
+    for value in values:
+        sketch.add(value)
+    exact = Counter(values)
+    for value, count in sketch.most_common(10):
+        # Never under the true count, and within the error of the Count-Min sketch over it
+        assert exact[value] <= count <= exact[value] + sketch.frequencies_.error_bound()
+    assert [v for v, _ in sketch.most_common(5)] == [v for v, _ in exact.most_common(5)]
+
+
+def test_unique_values_have_no_most_common():
+    sketch = ValueSketch(capacity=100)
+    for i in range(100000):
+        sketch.add(str(i))
+    assert sketch.most_common() == []
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from dtools_lib import spill
+
+
+def records(n, seed=0):
+    rng = random.Random(seed)
+    return ['{0:d}|{1:d}'.format(rng.randrange(50), i) for i in range(n)]
+
+
+def first_field(line):
+    return line.split('|')[0]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+@pytest.mark.parametrize('max_size', [1 << 28, 2000, 200])
+def test_sort_lines_matches_sorted(max_size, reverse):
+    lines = records(20000)
+    # Only sorting on the first field, so the order of equal keys shows whether the sort is stable
+    expected = sorted(lines, key=first_field, reverse=reverse)
+    assert list(spill.sort_lines(lines, first_field, reverse, max_size)) == expected
+
+
+def test_sort_lines_merges_in_levels(monkeypatch):
+    # With tiny runs and merges of 4 runs, thousands of runs go through several levels
+    monkeypatch.setattr(spill, 'MERGE_WIDTH', 4)
+    lines = records(5000, seed=1)
+    assert list(spill.sort_lines(lines, first_field, max_size=100)) == sorted(lines, key=first_field)
+
+
+def test_sort_lines_empty():
+    assert list(spill.sort_lines([], max_size=10)) == []
+
+
+def test_partitions_keep_lines_with_the_same_key_together():
+    lines = records(1000, seed=2)
+    with spill.Partitions(8) as partitions:
+        for line in lines:
+            partitions.write(first_field(line), line)
+        seen = {}
+        for i in range(len(partitions)):
+            for line in partitions.read(i):
+                assert seen.setdefault(first_field(line), i) == i
+    assert sum(1 for _ in seen) == len(set(first_field(line) for line in lines))
@@ -0,0 +1,34 @@
+from string import Template
+
+import pytest
+
+from dtools_lib.template import CompiledTemplate
+
+TEMPLATES = [
+    '$name~${city}~$zip',
+    'no variables at all',
+    '$$name costs $$5, $name pays $$$amount',
+    '${name}s and $names$name',
+    '$missing~${missing}~$name~$',
+    '$name and $name again, $ alone and $5',
+    '',
+]
+
+VALUES = {'name': 'Ada', 'city': 'London', 'zip': 2, 'amount': 1.5, 'names': ['x']}
+
+
+@pytest.mark.parametrize('text', TEMPLATES)
+def test_rendering_matches_safe_substitute(text):
+    assert CompiledTemplate(text).render(VALUES) == Template(text).safe_substitute(VALUES)
+    assert CompiledTemplate(text).render({}) == Template(text).safe_substitute({})
+
+
+def test_variables_in_order_of_first_occurrence():
+    assert CompiledTemplate('$b~${a}~$$c~$b~$d').variables() == ['b', 'a', 'd']
+    assert CompiledTemplate('$$ only').variables() == []
+
+
+def test_a_template_renders_many_times():
+    compiled = CompiledTemplate('$a-$b')
+    assert [compiled.render({'a': i, 'b': i * 2}) for i in range(3)] == ['0-0', '1-2', '2-4']
+    assert compiled.render({'a': 'x'}) == 'x-$b'
@@ -0,0 +1,136 @@
+import glob
+import os
+import random
+
+import pytest
+
+from dtools_lib import transforms
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def pattern_by_character(s):
+    """The character by character implementation that transforms.Pattern replaced"""
+    pattern = ''
+    alpha = 0
+    digit = 0
+    punct = 0
+    space = 0
+    for c in s:
+        if c.isalpha():
+            if alpha == 0:
+                if digit > 0:
+                    pattern += 'D' if digit == 1 else 'D+'
+                    digit = 0
+                elif punct > 0:
+                    pattern += 'P' if punct == 1 else 'P+'
+                    punct = 0
+                elif space > 0:
+                    pattern += ' '
+                    space = 0
+            alpha += 1
+        elif c.isdigit():
+            if digit == 0:
+                if alpha > 0:
+                    pattern += 'L' if alpha == 1 else 'L+'
+                    alpha = 0
+                elif punct > 0:
+                    pattern += 'P' if punct == 1 else 'P+'
+                    punct = 0
+                elif space > 0:
+                    pattern += ' '
+                    space = 0
+            digit += 1
+        elif c.isspace():
+            if space == 0:
+                if alpha > 0:
+                    pattern += 'L' if alpha == 1 else 'L+'
+                    alpha = 0
+                elif punct > 0:
+                    pattern += 'P' if punct == 1 else 'P+'
+                    punct = 0
+                elif digit > 0:
+                    pattern += 'D' if digit == 1 else 'D+'
+                    digit = 0
+            space += 1
+        else:
+            if punct == 0:
+                if alpha > 0:
+                    pattern += 'L' if alpha == 1 else 'L+'
+                    alpha = 0
+                elif digit > 0:
+                    pattern += 'D' if digit == 1 else 'D+'
+                    digit = 0
+                elif space > 0:
+                    pattern += ' '
+                    space = 0
+            punct += 1
+    if alpha > 0:
+        pattern += 'L' if alpha == 1 else 'L+'
+    elif digit > 0:
+        pattern += 'D' if digit == 1 else 'D+'
+    elif punct > 0:
+        pattern += 'P' if punct == 1 else 'P+'
+    elif space > 0:
+        pattern += ' '
+    return pattern
+
+
+def test_pattern_matches_character_by_character_on_random_strings():
+    # Letters, digits, white space and punctuation from outside ASCII as well
+    alphabet = 'aZ09 \t\x1c.-_|\u00e9\u00df\u00b2\u00bd\u0663\u2003\u3000\u4e2d\u2603\U0001f600'
+    rng = random.Random(0)
+    for _ in range(100000):
+        value = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(12)))
+        assert transforms.Pattern(value) == pattern_by_character(value), repr(value)
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(DATA_DIR, '*.csv'))), ids=os.path.basename)
+def test_pattern_matches_character_by_character_on_data_files(path):
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            for value in [line] + line.split('|'):
+                assert transforms.Pattern(value) == pattern_by_character(value), repr(value)
+
+
+@pytest.fixture
+def memoized():
+    transforms.memoize()
+    yield
+    transforms.memoize(0)
+
+
+def test_memoized_functions_give_the_same_results(memoized):
+    for name in transforms.MEMOIZED_FUNCTIONS:
+        assert hasattr(getattr(transforms, name), 'cache_info'), name
+    assert transforms.MD5('abc') == transforms.MD5('abc') == '900150983cd24fb0d6963f7d28e17f72'
+    assert transforms.ToAscii('Crème brûlée') == transforms.ToAscii(u'Crème brûlée') == 'Creme brulee'
+    assert transforms.memo_info()['MD5'].hits == 1
+
+
+def test_unhashable_arguments_are_not_cached(memoized, monkeypatch):
+    calls = []
+
+    def Length(values):
+        calls.append(values)
+        if not isinstance(values, (list, str)):
+            raise TypeError('not a sequence')
+        return len(values)
+    monkeypatch.setattr(transforms, 'Length', Length, raising=False)
+    transforms.memoize(names=['Length'])
+    assert transforms.Length([1, 2]) == transforms.Length([1, 2]) == 2
+    assert transforms.Length('ab') == transforms.Length('ab') == 2
+    assert len(calls) == 3
+    # A TypeError of the function itself is not hidden
+    with pytest.raises(TypeError):
+        transforms.Length(5)
+    assert transforms.memo_info()['Length'].hits == 1
+    transforms.memoize(0, names=['Length'])
+    del transforms._UNMEMOIZED_FUNCTIONS['Length']
+
+
+def test_pattern_is_not_memoized(memoized):
+    assert 'Pattern' not in transforms.MEMOIZED_FUNCTIONS
+    assert transforms.Pattern('AB-12') == 'L+PD+'
+    assert not hasattr(transforms.Pattern, 'cache_info')
@@ -0,0 +1,89 @@
+import datetime
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DT_GENERATE_TRIPS = os.path.join(ROOT, 'bin', 'dt_generate_trips')
+
+CONFIG = """[Generator]
+seed: {seed}
+trips_per_record = 6
+start_domestic_probability = 0.5
+visit_different_foreign_country_probability = 0.7
+return_from_different_foreign_country_probability = {return_from_different}
+days_min = 1
+days_max = 500
+days_mean = 20
+days_std_dev = 7
+date_format = {date_format}
+days_end = {days_end}
+airport_codes: {data}/large_airports.csv
+airline_codes: {data}/airlines.csv
+"""
+
+FAST_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Formats put together a field at a time, and formats left to strftime (each keeps the minute of days_end)
+FORMATS = [FAST_FORMAT, '%d/%m/%y %H.%M %j%%', '%Y%m%d%H%M', '%b %d %Y %I:%M %p']
+# Dates in this format are always formatted by strftime, one at a time
+STRFTIME_FORMAT = '%A ' + FAST_FORMAT
+
+
+def generate_trips(tmp_path, seed=1, records=50, return_from_different=0.2, date_format=FAST_FORMAT):
+    config = tmp_path / 'trips.ini'
+    config.write_text(CONFIG.format(seed=seed, return_from_different=return_from_different, date_format=date_format,
+                                    days_end=datetime.datetime(2016, 11, 1, 0, 1).strftime(date_format),
+                                    data=os.path.join(ROOT, 'data')))
+    stream = 'id\n' + ''.join('{0:d}\n'.format(i) for i in range(records))
+    result = subprocess.run([sys.executable, DT_GENERATE_TRIPS, str(config)], input=stream, capture_output=True,
+                            text=True, check=True, env=dict(os.environ, DTOOLS_CACHE_DIR=str(tmp_path / 'cache')))
+    lines = result.stdout.splitlines()
+    header = lines[0].split('~')
+    return [dict(zip(header, line.split('~'))) for line in lines[1:]]
+
+
+def legs(trips):
+    """Pairs of consecutive trips of the same record"""
+    return [(trip, next_trip) for trip, next_trip in zip(trips, trips[1:]) if trip['id'] == next_trip['id']]
+
+
+def test_same_seed_same_trips(tmp_path):
+    trips = generate_trips(tmp_path)
+    assert len(trips) == 50 * 6
+    assert generate_trips(tmp_path) == trips
+    assert generate_trips(tmp_path, seed=2) != trips
+
+
+def test_trips_arrive_after_departing_and_before_the_next_one(tmp_path):
+    trips = generate_trips(tmp_path)
+    for trip in trips:
+        departure = datetime.datetime.strptime(trip['departure_time'], FAST_FORMAT)
+        arrival = datetime.datetime.strptime(trip['arrival_time'], FAST_FORMAT)
+        assert departure < arrival <= datetime.datetime(2016, 11, 1, 0, 1)
+    for trip, next_trip in legs(trips):
+        assert trip['arrival_time'] < next_trip['departure_time']
+        assert int(next_trip['trip_number']) == int(trip['trip_number']) + 1
+
+
+def test_each_leg_departs_from_the_country_the_previous_one_arrived_in(tmp_path):
+    pairs = legs(generate_trips(tmp_path, return_from_different=0))
+    assert len(pairs) == 50 * 5
+    for trip, next_trip in pairs:
+        assert next_trip['departure_airport_country_code'] == trip['arrival_airport_country_code']
+        # Trips alternate between leaving and coming back to the domestic country
+        assert (trip['departure_airport_country_code'] == 'US') != (next_trip['departure_airport_country_code'] == 'US')
+    # Unless the traveller comes back from another foreign country
+    pairs = legs(generate_trips(tmp_path, return_from_different=1))
+    assert any(next_trip['departure_airport_country_code'] != trip['arrival_airport_country_code']
+               for trip, next_trip in pairs)
+
+
+@pytest.mark.parametrize('date_format', FORMATS)
+def test_dates_are_formatted_as_strftime_does(tmp_path, date_format):
+    expected = [[datetime.datetime.strptime(trip[field], STRFTIME_FORMAT).strftime(date_format)
+                 for field in ('departure_time', 'arrival_time')]
+                for trip in generate_trips(tmp_path, date_format=STRFTIME_FORMAT)]
+    trips = generate_trips(tmp_path, date_format=date_format)
+    assert [[trip['departure_time'], trip['arrival_time']] for trip in trips] == expected
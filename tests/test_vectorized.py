@@ -0,0 +1,60 @@
+import random
+
+import numpy
+import pytest
+
+from dtools_lib import transforms
+from dtools_lib import vectorized
+
+
+def scalar_results(fn, n, args):
+    results = []
+    for row in zip(*[vectorized.to_list(vectorized.column(arg, n)) for arg in args]):
+        try:
+            results.append(fn(*row))
+        except Exception as ex:
+            results.append(type(ex))
+    return results
+
+
+def kernel_results(name, n, args):
+    try:
+        return vectorized.to_list(vectorized.column(vectorized.KERNELS[name](n, *args), n))
+    except Exception as ex:
+        return type(ex)
+
+
+def test_haversine_matches_the_scalar_function():
+    rng = random.Random(0)
+    n = 1000
+    columns = [[rng.uniform(-180, 180) for _ in range(n)], [rng.uniform(-90, 90) for _ in range(n)],
+               numpy.array([rng.uniform(-180, 180) for _ in range(n)]), [rng.randint(-90, 90) for _ in range(n)]]
+    batch = kernel_results('Haversine', n, columns)
+    assert batch == pytest.approx(scalar_results(transforms.Haversine, n, columns), rel=1e-12)
+    # A scalar argument applies to every row
+    batch = kernel_results('Haversine', n, columns[:3] + [45.0])
+    assert batch == pytest.approx(scalar_results(transforms.Haversine, n, columns[:3] + [45.0]), rel=1e-12)
+
+
+@pytest.mark.parametrize('column', [['1.5', '2.5'], [1.5, '2.5'], [1.5, None], ['1.5', 2]])
+def test_haversine_does_not_coerce_strings(column):
+    # As in record mode, where fields are strings until converted with Float()
+    args = [column, [1.0, 2.0], 3.0, 4.0]
+    assert kernel_results('Haversine', 2, args) is TypeError
+    assert TypeError in scalar_results(transforms.Haversine, 2, args)
+
+
+def test_haversine_of_mixed_numbers():
+    args = [[1, 2.5, True, 10 ** 30], [1.0, 2.0, 3.0, 4.0], 3.0, 4.0]
+    assert kernel_results('Haversine', 4, args) == pytest.approx(scalar_results(transforms.Haversine, 4, args))
+
+
+@pytest.mark.parametrize('name', ['Sum', 'Product', 'Subtract', 'Remainder', 'Equals', 'LessThan'])
+def test_integer_arithmetic_does_not_wrap_around(name):
+    n = 6
+    values = ['4000000000', '-4000000000', '9223372036854775807', '3037000500', '1', str(10 ** 20)]
+    columns = [vectorized.Integer(n, values), vectorized.Integer(n, values[::-1])]
+    fn = getattr(transforms, name)
+    for args in [columns, [columns[0], 4000000000], [columns[0], 10 ** 19], [columns[0][:5], columns[1][:5]]]:
+        size = len(args[0])
+        assert kernel_results(name, size, args) == scalar_results(fn, size, args)